@@ -0,0 +1,186 @@
+# admission.py
+"""
+Control de admisión hacia Xpander (por worker).
+
+- `PriorityScheduler`: N slots concurrentes hacia el upstream. Si están todos
+  ocupados, los requests esperan ordenados por prioridad (score + peso del
+  intent) y, a igual prioridad, por orden de llegada. El aging suma
+  `aging` puntos por segundo de espera, así que nadie espera para siempre.
+  Cada waiter tiene un deadline de espera que crece con la prioridad: lo de
+  baja prioridad se descarta primero (503 + Retry-After). Con la cola llena,
+  un request nuevo desplaza al waiter de menor prioridad (o se rechaza él).
+- `TokenBuckets`: un bucket por cliente (api key / IP) para que uno solo no
+  acapare los slots (429 + Retry-After).
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable, Hashable, List, Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason  # rate_limited | queue_full | queue_timeout | shed
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()  # key -> [tokens, updated_at]
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: Hashable) -> float:
+        """Consume un token. Devuelve 0 si pudo o los segundos hasta que haya uno."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+
+class PriorityScheduler:
+    def __init__(
+        self,
+        slots: int,
+        max_queue: int = 1000,
+        min_wait: float = 2.0,
+        max_wait: float = 30.0,
+        aging: float = 1.0,
+        on_change: Optional[Callable[[int, int], None]] = None,
+        on_wait: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.min_wait = min_wait
+        self.max_wait = max(min_wait, max_wait)
+        self.aging = aging
+        self.on_change = on_change  # (queued, in_use) -> None
+        self.on_wait = on_wait  # (outcome, seconds) -> None; outcome: admitted|queue_full|queue_timeout|shed|cancelled
+        self._in_use = 0
+        self._queued = 0
+        self._heap: list = []  # [key, seq, future]; key = aging * llegada - prioridad (menor = primero)
+        self._seq = itertools.count()
+        self._hold_ewma = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slots > 0
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def deadline(self, priority: float) -> float:
+        """Espera máxima en cola: `min_wait` para prioridad 0, `max_wait` para 100."""
+        frac = min(1.0, max(0.0, priority / 100.0))
+        return self.min_wait + (self.max_wait - self.min_wait) * frac
+
+    def retry_after(self) -> int:
+        return max(1, int(self._hold_ewma * (self._queued + 1) / max(1, self.slots) + 0.999))
+
+    @asynccontextmanager
+    async def slot(self, priority: float):
+        if not self.enabled:
+            yield
+            return
+        await self.acquire(priority)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * (time.monotonic() - t0)
+            self.release()
+
+    async def acquire(self, priority: float) -> None:
+        if self._in_use < self.slots and not self._queued:
+            self._in_use += 1
+            self._changed()
+            self._waited("admitted", 0.0)
+            return
+
+        now = time.monotonic()
+        key = self.aging * now - priority
+        if self._queued >= self.max_queue:
+            victim = self._worst()
+            if victim is None or victim[0] <= key:
+                self._waited("queue_full", 0.0)
+                raise AdmissionRejected("queue_full", 503, self.retry_after())
+            victim[2].set_exception(AdmissionRejected("shed", 503, self.retry_after()))
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, [key, next(self._seq), fut])
+        self._queued += 1
+        self._changed()
+        outcome = "cancelled"
+        try:
+            await asyncio.wait_for(fut, self.deadline(priority))
+            outcome = "admitted"
+        except asyncio.TimeoutError:
+            outcome = "queue_timeout"
+            raise AdmissionRejected("queue_timeout", 503, self.retry_after()) from None
+        except AdmissionRejected as e:
+            outcome = e.reason
+            raise
+        except asyncio.CancelledError:
+            # el slot se pudo haber otorgado justo antes de la cancelación: devolverlo
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()
+            raise
+        finally:
+            self._queued -= 1
+            self._changed()
+            self._waited(outcome, time.monotonic() - now)
+            if len(self._heap) > 2 * self._queued + 64:
+                self._compact()
+
+    def release(self) -> None:
+        # el slot pasa directo al siguiente waiter vivo (sin bajar in_use)
+        while self._heap:
+            _, _, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._in_use -= 1
+        self._changed()
+
+    def _worst(self) -> Optional[list]:
+        live = [w for w in self._heap if not w[2].done()]
+        return max(live, key=lambda w: (w[0], w[1])) if live else None
+
+    def _compact(self) -> None:
+        self._heap = [w for w in self._heap if not w[2].done()]
+        heapq.heapify(self._heap)
+
+    def _changed(self) -> None:
+        if self.on_change:
+            self.on_change(self._queued, self._in_use)
+
+    def _waited(self, outcome: str, seconds: float) -> None:
+        if self.on_wait:
+            self.on_wait(outcome, seconds)
@@ -1,15 +1,35 @@
-from math import log
+import gc
+from math import ceil
 import os
-import json
 import asyncio
+import time
+from urllib.parse import urlsplit
+import hashlib
+import ipaddress
+import importlib.util
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 load_dotenv()
 
 import httpx
-from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+import config_store
+import event_log
+import metrics
+import webhooks
+from admission import AdmissionRejected, PriorityScheduler, TokenBuckets
+from config_store import ActiveConfig, ConfigWatcher
+from contract import decode_agent_result, decode_response, dumps, normalize_contract
 from intent_classifier import classify_intent_and_score
+from jobs import Job, JobManager, JobQueueFull
+from resilience import CircuitBreaker, CircuitOpen, UpstreamGuard, UpstreamTimeout
+from routing import DEFAULT_ROUTE, Route, RouteSpec, RouteTable, load_routes
+from similarity import NearDuplicateIndex, Sketch
+from response_cache import SingleFlight, TTLCache
+from stream_parser import ContractStream
 
 # =====================
 # Config
@@ -25,218 +45,1071 @@ XPANDER_BASE_URL = (os.getenv("XPANDER_BASE_URL", "https://api.xpander.ai").stri
 # Endpoint típico de inbound (si tu doc difiere, cambiás SOLO esta constante)
 XPANDER_INVOKE_PATH = os.getenv("XPANDER_INVOKE_PATH", f"/v1/agents/{XPANDER_AGENT_ID}/invoke").strip()
 
+# Pool de conexiones hacia Xpander (un cliente por worker, vive lo que vive la app)
+XPANDER_MAX_CONNECTIONS = int(os.getenv("XPANDER_MAX_CONNECTIONS", "100"))
+XPANDER_MAX_KEEPALIVE = int(os.getenv("XPANDER_MAX_KEEPALIVE", "20"))
+XPANDER_KEEPALIVE_EXPIRY = float(os.getenv("XPANDER_KEEPALIVE_EXPIRY", "30"))
+XPANDER_CONNECT_TIMEOUT = float(os.getenv("XPANDER_CONNECT_TIMEOUT", "10"))
+# HTTP/2 es opcional: requiere `pip install httpx[http2]` (paquete h2)
+XPANDER_HTTP2 = os.getenv("XPANDER_HTTP2", "").strip().lower() in ("1", "true", "yes")
+
+# Ruteo por intent a otros agents, cada uno con su pool/slots/timeout (ver routing.py).
+# Vacío = todo va a la ruta default (XPANDER_AGENT_ID + las variables de arriba).
+XPANDER_ROUTES_PATH = os.getenv("XPANDER_ROUTES_PATH", "").strip()
+
+# Cache de contracts normalizados (por worker). CACHE_TTL_SECONDS=0 lo desactiva.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+CACHE_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", "600"))  # respaldo si el breaker está abierto
+
+# Reuso de respuestas para mensajes casi iguales (MinHash/LSH por intent; 0 = desactivado)
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.85"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "5000"))
+SIMILARITY_MAX_BYTES = int(os.getenv("SIMILARITY_MAX_BYTES", str(16 * 1024 * 1024)))
+SIMILARITY_TTL_SECONDS = float(os.getenv("SIMILARITY_TTL_SECONDS", "3600"))
+
+# Resiliencia hacia Xpander (ver resilience.py)
+UPSTREAM_ADAPTIVE_TIMEOUT = os.getenv("UPSTREAM_ADAPTIVE_TIMEOUT", "1").strip().lower() in ("1", "true", "yes")
+UPSTREAM_TIMEOUT_MIN = float(os.getenv("UPSTREAM_TIMEOUT_MIN", "5"))
+UPSTREAM_TIMEOUT_MULTIPLIER = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", "3"))  # x p99
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "0").strip().lower() in ("1", "true", "yes")
+UPSTREAM_HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", "0.95"))
+UPSTREAM_HEDGE_MAX_RATIO = float(os.getenv("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+UPSTREAM_LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "200"))
+UPSTREAM_MIN_SAMPLES = int(os.getenv("UPSTREAM_MIN_SAMPLES", "20"))
+BREAKER_FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "15"))
+
+# Admisión a Xpander: slots por prioridad + rate limit por cliente (ver admission.py)
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS", str(XPANDER_MAX_CONNECTIONS)))  # 0 = sin límite
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "500"))
+ADMISSION_MIN_WAIT = float(os.getenv("ADMISSION_MIN_WAIT", "2"))  # espera máx en cola con prioridad 0
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))  # ... y con prioridad 100
+ADMISSION_AGING = float(os.getenv("ADMISSION_AGING", "2"))  # puntos de prioridad por segundo en cola
+# prioridad = score + peso del intent ("intent=peso,intent=peso")
+ADMISSION_INTENT_WEIGHTS = {
+    k.strip(): float(v)
+    for k, v in (p.split("=", 1) for p in os.getenv("ADMISSION_INTENT_WEIGHTS", "other=-20").split(",") if "=" in p)
+}
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))  # llamadas a Xpander por cliente; 0 = sin límite
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+# detrás de un proxy (Cloudflare, LB) la IP del socket es la del proxy: header con la IP real
+# ("CF-Connecting-IP", "X-Forwarded-For"), solo si el request viene de RATE_LIMIT_TRUSTED_PROXIES
+RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "").strip()
+RATE_LIMIT_TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(c.strip(), strict=False)
+    for c in os.getenv(
+        "RATE_LIMIT_TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+    ).split(",")
+    if c.strip()
+)
+
+# /invoke/stream: comentario SSE cada N segundos mientras Xpander no manda nada
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# /invoke/batch: llamadas simultáneas a Xpander por batch (sobre el pool compartido)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# /jobs: workers por proceso que drenan la cola hacia Xpander
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_QUEUE = int(os.getenv("JOBS_MAX_QUEUE", "100"))
+JOBS_TTL_SECONDS = float(os.getenv("JOBS_TTL_SECONDS", "600"))
+# SQLite compartido entre los workers de uvicorn (cualquiera toma y responde cualquier job)
+JOBS_STORE_PATH = os.getenv("JOBS_STORE_PATH", "jobs.db").strip()
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "0.5"))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))  # > INVOKE_TIMEOUT + ADMISSION_MAX_WAIT
+JOBS_MAX_WAIT = float(os.getenv("JOBS_MAX_WAIT", "30"))  # tope del long-poll
+
+# Warm-up al arrancar (ver /ready)
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))  # conexiones a Xpander a abrir (0 = no)
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "10"))
+
+# =====================
+# HTTP client (pooled, uno por ruta)
+# =====================
+# sin h2 httpx cae a HTTP/1.1 sin avisar; el lifespan lo loguea al arrancar
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _build_http_client(spec: RouteSpec) -> httpx.AsyncClient:
+    http2 = XPANDER_HTTP2 and _HTTP2_AVAILABLE
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(spec.timeout, connect=XPANDER_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=spec.max_connections,
+            max_keepalive_connections=spec.max_keepalive,
+            keepalive_expiry=XPANDER_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if XPANDER_HTTP2 and not _HTTP2_AVAILABLE:
+        print("[http] WARNING: XPANDER_HTTP2=1 pero falta el paquete h2 (pip install 'httpx[http2]'); se usa HTTP/1.1")
+    if _config_watcher is not None:
+        _config_watcher.load_now()
+        _config_watcher.ensure_started()
+    metrics.set_config_version(config_store.active().version)
+    await _jobs.start()
+    await _webhooks.start()
+    await _callbacks.start()
+    # en background: /health responde ya, /ready recién cuando terminó
+    warmup = asyncio.ensure_future(_warmup())
+    try:
+        yield
+    finally:
+        _set_ready(False)
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+        await _jobs.stop()
+        await _webhooks.stop()
+        await _callbacks.stop()
+        if _config_watcher is not None:
+            await _config_watcher.stop()
+        for route in _routes:
+            await route.aclose()
+        await event_log.get().aclose()
+        metrics.mark_process_dead()
+
+
+# =====================
+# Cache + coalescing
+# =====================
+_result_cache = TTLCache(
+    max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS, stale=CACHE_STALE_SECONDS,
+)
+_inflight = SingleFlight()
+_near_dups = NearDuplicateIndex(
+    threshold=SIMILARITY_THRESHOLD,
+    max_entries=SIMILARITY_MAX_ENTRIES,
+    max_bytes=SIMILARITY_MAX_BYTES,
+    ttl=SIMILARITY_TTL_SECONDS,
+)
+event_log.get().on_drop = metrics.EVENT_LOG_DROPPED.inc
+
+
+# =====================
+# Webhooks post-respuesta (ver webhooks.py; sin WEBHOOKS_PATH no hace nada)
+# =====================
+def _on_webhook_delivery(sink: str, outcome: str, items: int, seconds: float) -> None:
+    metrics.WEBHOOK_DELIVERIES.labels(sink, outcome).inc(items)
+    metrics.WEBHOOK_LATENCY.labels(sink).observe(seconds)
+
+
+_webhooks = webhooks.from_env(
+    on_delivery=_on_webhook_delivery,
+    on_drop=metrics.WEBHOOK_DROPPED.inc,
+    on_spool=metrics.WEBHOOK_SPOOL.set,
+)
+# callback_url de /jobs: su propio cliente, mismo spool/reintentos (sink "jobs:callback")
+_callbacks = webhooks.callback_dispatcher(
+    on_delivery=_on_webhook_delivery,
+    on_drop=metrics.WEBHOOK_DROPPED.inc,
+    on_spool=metrics.WEBHOOK_SPOOL.set,
+)
+
+
+# =====================
+# Rutas hacia Xpander: por ruta, resiliencia (timeout adaptativo, hedging,
+# circuit breaker) + admisión (slots por prioridad)
+# =====================
+def _admission_callbacks(route: str):
+    def on_wait(outcome: str, seconds: float) -> None:
+        metrics.ADMISSION_WAIT.labels(route, outcome).observe(seconds)
+        if outcome != "admitted":
+            metrics.ADMISSION_REJECTED.labels(route, outcome).inc()
+        if seconds > 0:
+            metrics.record_stage("admission", seconds)
+
+    def on_change(queued: int, in_use: int) -> None:
+        metrics.ADMISSION_QUEUE.labels(route).set(queued)
+        metrics.ADMISSION_SLOTS_IN_USE.labels(route).set(in_use)
+
+    return on_wait, on_change
+
+
+def _build_route(spec: RouteSpec) -> Route:
+    guard = UpstreamGuard(
+        CircuitBreaker(
+            failure_ratio=BREAKER_FAILURE_RATIO,
+            min_calls=BREAKER_MIN_CALLS,
+            window=BREAKER_WINDOW,
+            cooldown=BREAKER_COOLDOWN_SECONDS,
+            on_state_change=lambda old, new: metrics.set_breaker_state(spec.name, old, new),
+        ),
+        max_timeout=spec.timeout,
+        min_timeout=min(UPSTREAM_TIMEOUT_MIN, spec.timeout),
+        timeout_multiplier=UPSTREAM_TIMEOUT_MULTIPLIER,
+        adaptive_timeout=UPSTREAM_ADAPTIVE_TIMEOUT,
+        hedge=UPSTREAM_HEDGE,
+        hedge_quantile=UPSTREAM_HEDGE_QUANTILE,
+        hedge_max_ratio=UPSTREAM_HEDGE_MAX_RATIO,
+        window=UPSTREAM_LATENCY_WINDOW,
+        min_samples=UPSTREAM_MIN_SAMPLES,
+        ignore=(httpx.PoolTimeout,),  # pool local lleno: no dice nada de Xpander
+        on_hedge=lambda outcome: metrics.HEDGES.labels(outcome).inc(),
+    )
+    on_wait, on_change = _admission_callbacks(spec.name)
+    admission = PriorityScheduler(
+        spec.concurrency,
+        max_queue=ADMISSION_MAX_QUEUE,
+        min_wait=ADMISSION_MIN_WAIT,
+        max_wait=ADMISSION_MAX_WAIT,
+        aging=ADMISSION_AGING,
+        on_change=on_change,
+        on_wait=on_wait,
+    )
+    # `_build_http_client` se resuelve al crear el cliente (se puede reemplazar en tests)
+    return Route(spec, guard, admission, lambda: _build_http_client(spec))
+
+
+_default_spec = RouteSpec(
+    DEFAULT_ROUTE,
+    agent_id=XPANDER_AGENT_ID,
+    invoke_path=XPANDER_INVOKE_PATH,
+    base_url=XPANDER_BASE_URL,
+    max_connections=XPANDER_MAX_CONNECTIONS,
+    max_keepalive=XPANDER_MAX_KEEPALIVE,
+    concurrency=ADMISSION_SLOTS,
+    timeout=INVOKE_TIMEOUT,
+)
+_routes = RouteTable([
+    _build_route(spec)
+    for spec in (load_routes(XPANDER_ROUTES_PATH, _default_spec) if XPANDER_ROUTES_PATH else [_default_spec])
+])
+
+
+def _route_for(intent_pack: dict) -> Route:
+    return _routes.for_intent(intent_pack["intent"]["id"])
+
+
+# =====================
+# Rate limit por cliente + prioridad de admisión
+# =====================
+_client_buckets = TokenBuckets(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+
+def _parse_ip(value: str):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def _trusted_proxy(ip) -> bool:
+    return ip is not None and any(ip in net for net in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def _client_id(request: Request) -> str:
+    """
+    Identidad para el rate limit: la IP del cliente. No la api key: hay una sola
+    (INTAKE_API_KEY) y sin ella cualquiera manda la que quiera.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not RATE_LIMIT_CLIENT_IP_HEADER or not _trusted_proxy(_parse_ip(peer)):
+        return "ip:" + peer
+    # X-Forwarded-For: la primera IP (desde la derecha) que no es de un proxy nuestro
+    hops = [_parse_ip(h) for h in request.headers.get(RATE_LIMIT_CLIENT_IP_HEADER, "").split(",")]
+    hops = [h for h in hops if h is not None]
+    for ip in reversed(hops):
+        if not _trusted_proxy(ip):
+            return f"ip:{ip}"
+    return f"ip:{hops[0]}" if hops else "ip:" + peer
+
+
+def _priority(intent_pack: dict) -> float:
+    return intent_pack["score"] + ADMISSION_INTENT_WEIGHTS.get(intent_pack["intent"]["id"], 0.0)
+
+
+def _admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail={"error": "rate_limited" if e.reason == "rate_limited" else f"admission_{e.reason}", "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@asynccontextmanager
+async def _upstream_turn(route: Route, intent_pack: dict, client: str | None):
+    """Turno para llamar a Xpander: token del cliente y después un slot de la ruta según prioridad."""
+    if client is not None:
+        wait = _client_buckets.take(client)
+        if wait > 0:
+            metrics.ADMISSION_REJECTED.labels(route.name, "rate_limited").inc()
+            raise _admission_error(AdmissionRejected("rate_limited", 429, max(1, ceil(wait))))
+    try:
+        async with route.admission.slot(_priority(intent_pack)):
+            yield
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+
+
+# =====================
+# Config de intents (hot-reload si INTENT_CONFIG_PATH está seteado)
+# =====================
+def _on_config_change(old: ActiveConfig, new: ActiveConfig | None, error: str | None) -> None:
+    if new is None:
+        metrics.CONFIG_RELOADS.labels("error").inc()
+        print("[config] reload rechazado, sigue", old.version, "-", error)
+        return
+    metrics.CONFIG_RELOADS.labels("ok").inc()
+    metrics.set_config_version(new.version, previous=old.version)
+    print("[config] activa", new.version, "(antes", old.version + ")")
+
+
+_config_watcher = (
+    ConfigWatcher(config_store.INTENT_CONFIG_PATH, config_store.INTENT_CONFIG_POLL_SECONDS, on_change=_on_config_change)
+    if config_store.INTENT_CONFIG_PATH else None
+)
+
+
+def _cache_key(message: str, agent_id: str) -> str:
+    # mismo mensaje salvo mayúsculas/espacios => misma key
+    normalized = " ".join((message or "").lower().split())
+    return hashlib.sha256(f"{agent_id}\n{normalized}".encode("utf-8")).hexdigest()
+
+
 # =====================
 # App
 # =====================
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 class InvokeReq(BaseModel):
     message: str
 
 
+class InvokeBatchReq(BaseModel):
+    messages: list[str]
+
+
+class JobReq(BaseModel):
+    message: str
+    callback_url: str | None = None
+
+
 @app.get("/health")
 def health():
-    return {"ok": True}
+    out = {"ok": True, "config_version": config_store.active().version, "upstream": _routes.default.guard.snapshot()}
+    if len(_routes) > 1:
+        out["routes"] = {route.name: route.snapshot() for route in _routes}
+    return out
 
 
-def _parse_json_or_error(text: str) -> dict:
-    if not text:
-        return {"error": "empty_response"}
-    t = text.strip()
-    try:
-        obj = json.loads(t)
-        if isinstance(obj, dict):
-            return obj
-        return {"error": "non_object_json", "raw": obj}
-    except Exception:
-        # intenta extraer bloque json
-        start = t.find("{")
-        end = t.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            try:
-                obj = json.loads(t[start:end + 1])
-                if isinstance(obj, dict):
-                    return obj
-                return {"error": "non_object_json", "raw": obj}
-            except Exception:
-                pass
-        return {"error": "non_json_response", "raw": t[:2000]}
+@app.get("/ready")
+def ready():
+    """503 hasta que termina el warm-up de este worker (para HEALTHCHECK / balanceador)."""
+    return Response(
+        content=dumps({"ready": _warmup_state["ready"], "warmup": _warmup_state}),
+        status_code=200 if _warmup_state["ready"] else 503,
+        media_type="application/json",
+    )
+
 
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
-async def _xpander_invoke(message: str) -> dict:
+
+def _xpander_request(message: str, route: Route) -> tuple[str, dict, dict]:
     if not XPANDER_API_KEY:
         raise HTTPException(status_code=500, detail={"error": "missing_xpander_api_key"})
-    if not XPANDER_AGENT_ID:
-        raise HTTPException(status_code=500, detail={"error": "missing_xpander_agent_id"})
+    if not route.spec.agent_id:
+        raise HTTPException(status_code=500, detail={"error": "missing_xpander_agent_id", "route": route.name})
 
-    url = f"{XPANDER_BASE_URL}{XPANDER_INVOKE_PATH}"
+    url = route.spec.url
     headers = {
         "x-api-key": XPANDER_API_KEY,
         "Content-Type": "application/json",
     }
     payload = {"input": {"text": message}}
+    return url, headers, payload
 
-    timeout = httpx.Timeout(INVOKE_TIMEOUT, connect=10.0)
-    # Muestra en consola los parámetros que se usarán en el fetch
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            r = await client.post(url, headers=headers, json=payload)
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail={"error": "xpander_timeout", "after_seconds": INVOKE_TIMEOUT})
-        except Exception as e:
-            raise HTTPException(status_code=502, detail={"error": "xpander_network_error", "type": type(e).__name__, "message": str(e)[:300]})
 
-    # Xpander a veces devuelve texto/json; normalizamos
-    body_text = r.text or ""
-    data = _parse_json_or_error(body_text)
+def _error_code(e: HTTPException) -> str:
+    return e.detail.get("error", "unknown") if isinstance(e.detail, dict) else "unknown"
 
-    if r.status_code >= 400:
-        raise HTTPException(
-            status_code=502,
-            detail={
-                "error": "xpander_bad_status",
-                "status_code": r.status_code,
-                "response": data,
-            },
+
+def _transport_error(e: Exception, route: Route) -> HTTPException:
+    if isinstance(e, CircuitOpen):
+        return HTTPException(
+            status_code=503,
+            detail={"error": "xpander_circuit_open", "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if isinstance(e, httpx.PoolTimeout):
+        return HTTPException(
+            status_code=503,
+            detail={"error": "xpander_pool_exhausted", "route": route.name, "max_connections": route.spec.max_connections},
         )
+    if isinstance(e, UpstreamTimeout):
+        return HTTPException(status_code=504, detail={"error": "xpander_timeout", "after_seconds": round(e.after_seconds, 1)})
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail={"error": "xpander_timeout", "after_seconds": route.spec.timeout})
+    return HTTPException(status_code=502, detail={"error": "xpander_network_error", "type": type(e).__name__, "message": str(e)[:300]})
 
-    # si el body no es json, también es 502
-    if data.get("error"):
-        raise HTTPException(status_code=502, detail={"error": "xpander_non_json", "response": data})
 
-    return data
+async def _xpander_invoke(message: str, route: Route) -> dict:
+    """Invoca al agente de la ruta y devuelve el contract normalizado."""
+    url, headers, payload = _xpander_request(message, route)
+
+    # Cliente compartido de la ruta: reusa conexiones keep-alive (sin handshake TCP/TLS por request)
+    client = route.client()
+
+    async def attempt() -> tuple[httpx.Response, metrics.UpstreamTrace]:
+        trace = metrics.UpstreamTrace()
+        metrics.UPSTREAM_INFLIGHT.inc()
+        try:
+            r = await client.post(url, headers=headers, json=payload, extensions={"trace": trace})
+        finally:
+            metrics.UPSTREAM_INFLIGHT.dec()
+        metrics.UPSTREAM_STATUS.labels(str(r.status_code)).inc()
+        return r, trace
+
+    event_log.note(route=route.name)
+    t0 = time.perf_counter()
+    try:
+        with metrics.stage("upstream"):
+            r, trace = await route.guard.call(attempt, failed=lambda res: res[0].status_code >= 500)
+    except Exception as e:
+        err = _transport_error(e, route)
+        metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(err)).inc()
+        raise err
+    finally:
+        metrics.UPSTREAM_LATENCY.labels(route.name).observe(time.perf_counter() - t0)
+        metrics.UPSTREAM_TIMEOUT.labels(route.name).set(route.guard.timeout())
+    trace.record()
+    event_log.note(upstream_status=r.status_code)
 
-import re
-from fastapi import HTTPException
+    # Xpander a veces devuelve texto/json; decode en una sola pasada sobre los bytes
+    try:
+        with metrics.stage("decode"):
+            agent_obj = decode_agent_result(r.status_code, r.content)
+    except HTTPException as e:
+        metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(e)).inc()
+        raise
+    metrics.UPSTREAM_RESULTS.labels(route.name, "ok").inc()
 
-_REQUIRED_KEYS = {"summary", "assumptions", "missing_questions", "mvp_plan", "risks"}
-_EFFORT_RE = re.compile(r"^\d+(m|h|d)$")  # 15m, 1h, 2d
+    with metrics.stage("normalize"):
+        return normalize_contract(agent_obj)
 
 
-def _extract_agent_result(envelope: dict) -> dict:
+async def _xpander_stream(message: str, intent_pack: dict, client: str | None = None):
     """
-    Xpander suele devolver un execution envelope con un campo `result`
-    que a veces viene como string JSON escapado.
-    Acá devolvemos SOLO el JSON final del agente (dict).
+    Como `_xpander_invoke`, pero entrega el body en pedazos a medida que llega.
+    Espera su turno de admisión en la ruta antes de conectar y retiene el slot mientras dure el stream.
     """
-    if not isinstance(envelope, dict):
-        raise HTTPException(status_code=502, detail={"error": "xpander_invalid_envelope"})
+    route = _route_for(intent_pack)
+    async with _upstream_turn(route, intent_pack, client):
+        async for chunk in _xpander_stream_body(message, route):
+            yield chunk
 
-    if "result" not in envelope:
-        # Algunos endpoints podrían devolver directamente el resultado; soportamos eso best-effort
-        if _ALLOWED_KEYS.issubset(set(envelope.keys())):
-            return envelope
-        raise HTTPException(status_code=502, detail={"error": "xpander_missing_result", "response": envelope})
 
-    raw = envelope.get("result")
+async def _xpander_stream_body(message: str, route: Route):
+    url, headers, payload = _xpander_request(message, route)
 
-    # `result` puede venir como dict o como string JSON
-    if isinstance(raw, dict):
-        return raw
+    # sin hedging ni timeout total adaptativo (un stream no se puede cambiar a mitad
+    # de camino y dura lo que dure la generación); sí cuenta para el breaker
+    breaker = route.guard.breaker
+    if not breaker.allow():
+        err = _transport_error(CircuitOpen(breaker.retry_after), route)
+        metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(err)).inc()
+        raise err
 
-    if isinstance(raw, str):
-        try:
-            obj = json.loads(raw)
-            if isinstance(obj, dict):
-                return obj
-            raise HTTPException(status_code=502, detail={"error": "xpander_result_not_object", "raw": obj})
-        except Exception:
-            raise HTTPException(
-                status_code=502,
-                detail={"error": "xpander_result_not_json", "raw": (raw or "")[:2000]},
-            )
-
-    raise HTTPException(status_code=502, detail={"error": "xpander_result_bad_type", "type": str(type(raw))})
-
-def _normalize_contract(obj: dict) -> dict:
+    client = route.client()
+    event_log.note(route=route.name)
+    ok = None
+    t0 = time.perf_counter()
+    metrics.UPSTREAM_INFLIGHT.inc()
+    try:
+        async with client.stream("POST", url, headers=headers, json=payload) as r:
+            metrics.UPSTREAM_STATUS.labels(str(r.status_code)).inc()
+            event_log.note(upstream_status=r.status_code)
+            ok = r.status_code < 500
+            if r.status_code >= 400:
+                decode_response(r.status_code, await r.aread())
+            async for chunk in r.aiter_text():
+                yield chunk
+    except HTTPException as e:
+        metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(e)).inc()
+        raise
+    except Exception as e:
+        if not isinstance(e, httpx.PoolTimeout):
+            ok = False
+        err = _transport_error(e, route)
+        metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(err)).inc()
+        raise err
+    finally:
+        breaker.record(ok)
+        metrics.UPSTREAM_INFLIGHT.dec()
+        metrics.UPSTREAM_LATENCY.labels(route.name).observe(time.perf_counter() - t0)
+
+
+def _near_duplicate(message: str, intent_pack: dict) -> tuple[dict | None, float | None, Sketch | None]:
+    """(contract reusable | None, similitud del vecino más parecido | None, sketch para indexar)."""
+    intent_id = intent_pack["intent"]["id"]
+    if not _near_dups.enabled or not intent_id:
+        return None, None, None
+    sketch = _near_dups.sketch(message)
+    if sketch is None:
+        return None, None, None
+    found, similarity = _near_dups.lookup(intent_id, sketch)
+    if not similarity:
+        return None, None, sketch
+    metrics.SIMILARITY.observe(similarity)
+    event_log.note(similarity=round(similarity, 3))
+    return found, round(similarity, 3), sketch
+
+
+async def _invoke_contract(
+    message: str, intent_pack: dict, cfg: ActiveConfig | None = None, client: str | None = None
+) -> tuple[dict, str, float | None]:
     """
-    No estricto:
-    - Permite keys extra (las ignora).
-    - Si faltan keys, las completa con defaults.
-    - Si tipos vienen mal, intenta convertir; si no, default.
-    - Nunca levanta 502 por contrato.
+    Devuelve (contract, status, similarity) con status en
+    hit|similar|miss|coalesced|short_circuit|stale.
+    Mensajes idénticos en vuelo comparten una sola llamada a Xpander; uno casi
+    igual a otro ya respondido del mismo intent reusa esa respuesta (`similar`);
+    con el breaker abierto se devuelve la última respuesta cacheada aunque esté vencida.
+    Solo lo que llega a Xpander pasa por la admisión (`client` = identidad para el rate limit).
+    El dict devuelto puede estar compartido con la cache: no mutarlo.
     """
+    policy = (cfg or config_store.active()).short_circuit
+    if policy.match(intent_pack):
+        intent_id = intent_pack["intent"]["id"]
+        metrics.SHORT_CIRCUITS.labels(intent_id or "unknown").inc()
+        return policy.response(intent_id), "short_circuit", None
+
+    route = _route_for(intent_pack)
+    key = _cache_key(message, route.spec.agent_id)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        metrics.CACHE_RESULTS.labels("hit").inc()
+        return cached, "hit", None
+
+    similar, similarity, sketch = _near_duplicate(message, intent_pack)
+    if similar is not None:
+        metrics.CACHE_RESULTS.labels("similar").inc()
+        return similar, "similar", similarity
+
+    async def _leader() -> dict:
+        async with _upstream_turn(route, intent_pack, client):
+            result = await _xpander_invoke(message, route)
+        size = len(dumps(result))
+        _result_cache.set(key, result, size=size)
+        if sketch is not None:
+            _near_dups.add(intent_pack["intent"]["id"], sketch, result, size=size)
+        return result
+
+    try:
+        result, shared = await _inflight.do(key, _leader)
+    except HTTPException as e:
+        stale = _result_cache.get_stale(key) if _error_code(e) == "xpander_circuit_open" else None
+        if stale is None:
+            raise
+        metrics.CACHE_RESULTS.labels("stale").inc()
+        return stale, "stale", None
+    status = "coalesced" if shared else "miss"
+    metrics.CACHE_RESULTS.labels(status).inc()
+    return result, status, similarity
 
-    if not isinstance(obj, dict):
-        return {
-            "summary": "",
-            "assumptions": [],
-            "missing_questions": [],
-            "mvp_plan": [],
-            "risks": [],
+
+def _classify_safe(message: str, cfg: ActiveConfig | None = None) -> dict:
+    try:
+        with metrics.stage("classify"):
+            pack = classify_intent_and_score(message, (cfg or config_store.active()).classifier)
+    except Exception as e:
+        pack = {
+            "intent": {"id": "", "label": ""},
+            "score": 0,
+            "reasons": [f"classifier_error:{type(e).__name__}"],
         }
+    metrics.observe_intent(pack["intent"]["id"], pack["score"])
+    return pack
 
-    def _as_str(x):
-        return x.strip() if isinstance(x, str) else str(x) if x is not None else ""
-
-    def _as_list_str(x):
-        if isinstance(x, list):
-            return [_as_str(i) for i in x if _as_str(i)]
-        if isinstance(x, str) and x.strip():
-            return [x.strip()]
-        return []
-
-    def _as_mvp(x):
-        if not isinstance(x, list):
-            return []
-        out = []
-        for it in x:
-            if isinstance(it, dict):
-                step = _as_str(it.get("step"))
-                effort = _as_str(it.get("effort"))
-                if step:
-                    out.append({"step": step, "effort": effort or "?"})
-            elif isinstance(it, str) and it.strip():
-                out.append({"step": it.strip(), "effort": "?"})
-        return out
-
-    normalized = {
-        "summary": _as_str(obj.get("summary")),
-        "assumptions": _as_list_str(obj.get("assumptions")),
-        "missing_questions": _as_list_str(obj.get("missing_questions")),
-        "mvp_plan": _as_mvp(obj.get("mvp_plan")),
-        "risks": _as_list_str(obj.get("risks")),
-    }
 
-    # límites suaves (no estrictos)
-    if len(normalized["missing_questions"]) > 7:
-        normalized["missing_questions"] = normalized["missing_questions"][:7]
+def _result_headers(status: str, intent_pack: dict, cfg: ActiveConfig, similarity: float | None = None) -> dict:
+    headers = {"x-config-version": cfg.version}
+    if status == "short_circuit":
+        headers["x-short-circuit"] = "1"
+        headers["x-short-circuit-reason"] = cfg.short_circuit.match(intent_pack) or ""
+    else:
+        headers["x-cache"] = status
+    if similarity is not None:
+        # similitud con la respuesta más parecida del índice (reusada si x-cache: similar)
+        headers["x-similarity"] = f"{similarity:.3f}"
+    return headers
 
-    if len(normalized["mvp_plan"]) > 8:
-        normalized["mvp_plan"] = normalized["mvp_plan"][:8]
 
-    return normalized
+def _log_event(
+    kind: str,
+    message: str,
+    intent_pack: dict,
+    cfg: ActiveConfig,
+    notes: dict,
+    status: str | None = None,
+    size: int | None = None,
+    result: dict | None = None,
+    error: HTTPException | None = None,
+    stages: bool = True,
+) -> None:
+    """Un evento por mensaje procesado (ver event_log.py); no hace I/O."""
+    if not event_log.enabled():
+        return
+    if size is None and result is not None:
+        size = len(dumps(result))
+    event_log.emit({
+        "event": kind,
+        "msg_hash": event_log.message_hash(message),
+        "intent": intent_pack["intent"]["id"],
+        "score": intent_pack["score"],
+        "reasons": intent_pack["reasons"],
+        "config_version": cfg.version,
+        "cache": status,
+        "route": notes.get("route"),
+        "upstream_status": notes.get("upstream_status"),
+        "similarity": notes.get("similarity"),
+        "contract_bytes": size,
+        "error": _error_code(error) if error is not None else None,
+        "status_code": error.status_code if error is not None else 200,
+        "stages_ms": metrics.current_stages() if stages else None,
+    })
 
-@app.post("/invoke")
-async def invoke(req: InvokeReq, x_api_key: str | None = Header(default=None)):
+
+def _fan_out(kind: str, intent_pack: dict, cfg: ActiveConfig, status: str, result: dict) -> None:
+    """Encola el resultado para los webhooks que lo filtren (ver webhooks.py); no hace I/O."""
+    if not _webhooks.enabled:
+        return
+    _webhooks.enqueue({
+        "event": "intake.result",
+        "source": kind,
+        "intent": intent_pack["intent"]["id"],
+        "intent_label": intent_pack["intent"]["label"],
+        "score": intent_pack["score"],
+        "reasons": intent_pack["reasons"],
+        "config_version": cfg.version,
+        "cache": status,
+        "result": result,
+    })
+
+
+def _check_api_key(x_api_key: str | None) -> None:
     if INTAKE_API_KEY and (x_api_key or "").strip() != INTAKE_API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+
+@app.post("/invoke")
+async def invoke(req: InvokeReq, request: Request, x_api_key: str | None = Header(default=None)):
+    _check_api_key(x_api_key)
+
     user_msg = (req.message or "").strip()
+    cfg = config_store.active()
+    notes = event_log.start()
 
     # intent headers (local, determinístico)
+    intent_pack = _classify_safe(user_msg, cfg)
+
+    try:
+        result_obj, status, similarity = await _invoke_contract(
+            user_msg, intent_pack, cfg, _client_id(request)
+        )
+    except HTTPException as e:
+        _log_event("invoke", user_msg, intent_pack, cfg, notes, error=e)
+        raise
+
+    with metrics.stage("serialize"):
+        body = dumps(result_obj)
+    _log_event("invoke", user_msg, intent_pack, cfg, notes, status=status, size=len(body))
+    _fan_out("invoke", intent_pack, cfg, status, result_obj)
+    resp = Response(
+        content=body,
+        media_type="application/json",
+        headers=_result_headers(status, intent_pack, cfg, similarity),
+    )
+    return resp
+
+
+# =====================
+# Streaming (SSE)
+# =====================
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+async def _invoke_events(
+    message: str,
+    intent_pack: dict,
+    cfg: ActiveConfig,
+    cached: dict | None,
+    status: str,
+    sketch: Sketch | None = None,
+    client: str | None = None,
+):
+    """
+    Eventos: `intent` (inmediato) -> `delta` (texto del agente a medida que llega)
+    -> `field` (cada campo del contract apenas se completa) -> `result` | `error`.
+    """
+    notes = event_log.start()
+    yield _sse("intent", intent_pack)
+    if cached is not None:
+        _log_event("stream", message, intent_pack, cfg, notes, status=status, result=cached)
+        yield _sse("result", cached)
+        _fan_out("stream", intent_pack, cfg, status, cached)
+        return
+
+    route = _route_for(intent_pack)
+    parser = ContractStream()
+    chunks = _xpander_stream(message, intent_pack, client)
+    pending = None
     try:
-        intent_pack = classify_intent_and_score(user_msg)
+        while True:
+            pending = asyncio.ensure_future(chunks.__anext__())
+            while not pending.done():
+                done, _ = await asyncio.wait({pending}, timeout=SSE_HEARTBEAT_SECONDS)
+                if not done:
+                    yield ": ping\n\n"
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                break
+            new_fields = parser.feed(chunk)
+            text = parser.take_text()
+            if text:
+                yield _sse("delta", {"text": text})
+            for key, value in new_fields:
+                yield _sse("field", {"key": key, "value": value})
+
+        if parser.complete:
+            result_obj = normalize_contract(parser.fields)
+        else:
+            # el agente no devolvió un objeto parseable en streaming: decode completo (mismos errores que /invoke)
+            try:
+                result_obj = decode_response(200, parser.body)
+            except HTTPException as e:
+                metrics.UPSTREAM_RESULTS.labels(route.name, _error_code(e)).inc()
+                raise
+        metrics.UPSTREAM_RESULTS.labels(route.name, "ok").inc()
+    except HTTPException as e:
+        _log_event("stream", message, intent_pack, cfg, notes, error=e)
+        yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        return
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        await chunks.aclose()
+
+    key = _cache_key(message, route.spec.agent_id)
+    size = len(dumps(result_obj))
+    _result_cache.set(key, result_obj, size=size)
+    if sketch is not None:
+        _near_dups.add(intent_pack["intent"]["id"], sketch, result_obj, size=size)
+    _log_event("stream", message, intent_pack, cfg, notes, status=status, size=size)
+    yield _sse("result", result_obj)
+    _fan_out("stream", intent_pack, cfg, status, result_obj)
+
+
+@app.post("/invoke/stream")
+async def invoke_stream(req: InvokeReq, request: Request, x_api_key: str | None = Header(default=None)):
+    _check_api_key(x_api_key)
+
+    user_msg = (req.message or "").strip()
+    cfg = config_store.active()
+    intent_pack = _classify_safe(user_msg, cfg)
+    if cfg.short_circuit.match(intent_pack):
+        # contract precalculado: sale junto con el intent, sin llamar a Xpander
+        cached, status, similarity = await _invoke_contract(user_msg, intent_pack, cfg)
+        sketch = None
+    else:
+        route = _route_for(intent_pack)
+        key = _cache_key(user_msg, route.spec.agent_id)
+        cached = _result_cache.get(key)
+        status = "hit" if cached is not None else "miss"
+        similarity = sketch = None
+        if cached is None:
+            cached, similarity, sketch = _near_duplicate(user_msg, intent_pack)
+            status = "similar" if cached is not None else "miss"
+        if cached is None and route.guard.breaker.is_open:
+            cached = _result_cache.get_stale(key)
+            status = "stale" if cached is not None else "miss"
+        metrics.CACHE_RESULTS.labels(status).inc()
+
+    return StreamingResponse(
+        _invoke_events(user_msg, intent_pack, cfg, cached, status, sketch, _client_id(request)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # que ningún proxy bufferee el stream
+            **_result_headers(status, intent_pack, cfg, similarity),
+        },
+    )
+
+
+# =====================
+# Batch
+# =====================
+async def _invoke_item(
+    index: int, message: str, sem: asyncio.Semaphore, cfg: ActiveConfig, client: str | None = None
+) -> dict:
+    """Un item del batch: nunca levanta, los errores quedan en `error`."""
+    message = (message or "").strip()
+    notes = event_log.start()
+    intent_pack = _classify_safe(message, cfg)
+    item = {"index": index, **intent_pack}
+    try:
+        async with sem:
+            result_obj, status, similarity = await _invoke_contract(message, intent_pack, cfg, client)
+        item["result"] = result_obj
+        if status == "short_circuit":
+            item["short_circuit"] = True
+        else:
+            item["cache"] = status
+        if similarity is not None:
+            item["similarity"] = similarity
+        # en batch las etapas del timer son de todo el request, no de este item
+        _log_event("batch_item", message, intent_pack, cfg, notes, status=status, result=result_obj, stages=False)
+        _fan_out("batch", intent_pack, cfg, status, result_obj)
+    except HTTPException as e:
+        _log_event("batch_item", message, intent_pack, cfg, notes, error=e, stages=False)
+        item["error"] = {"status_code": e.status_code, "detail": e.detail}
     except Exception as e:
-        intent_pack = {
-            "intent": {"id": "", "label": ""},
-            "score": 0,
-            "reasons": [f"classifier_error:{type(e).__name__}"],
-        }
+        item["error"] = {"status_code": 500, "detail": {"error": "internal_error", "type": type(e).__name__}}
+    return item
 
-    # 1) Llamar a Xpander (tu función actual)
-    envelope = await _xpander_invoke(user_msg)
 
-    # 2) Extraer JSON final del agente
-    result_obj = _extract_agent_result(envelope)
+async def _batch_ndjson(tasks: list[asyncio.Task]):
+    try:
+        for fut in asyncio.as_completed(tasks):
+            item = await fut
+            yield dumps(item) + b"\n"
+    finally:
+        # cliente desconectado: no seguimos gastando llamadas a Xpander
+        for t in tasks:
+            t.cancel()
 
-    # 3) Validar contract estricto
-    agent_obj = _extract_agent_result(envelope)
-    result_obj = _normalize_contract(agent_obj)
 
-    resp = Response(
-        content=json.dumps(result_obj, ensure_ascii=False),
+@app.post("/invoke/batch")
+async def invoke_batch(
+    req: InvokeBatchReq,
+    request: Request,
+    stream: bool = Query(default=False),
+    x_api_key: str | None = Header(default=None),
+):
+    """
+    Clasifica e invoca varios mensajes en un request.
+    - default: `{"items": [...]}` en el mismo orden que `messages`.
+    - `?stream=true`: NDJSON, un item por línea apenas termina (usar `index` para ordenar).
+    """
+    _check_api_key(x_api_key)
+
+    if len(req.messages) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail={"error": "batch_too_large", "max_items": BATCH_MAX_ITEMS})
+
+    cfg = config_store.active()
+    sem = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    client = _client_id(request)
+    tasks = [asyncio.ensure_future(_invoke_item(i, m, sem, cfg, client)) for i, m in enumerate(req.messages)]
+    headers = {"x-config-version": cfg.version}
+
+    if stream:
+        return StreamingResponse(_batch_ndjson(tasks), media_type="application/x-ndjson", headers=headers)
+
+    items = await asyncio.gather(*tasks)
+    return Response(
+        content=dumps({"items": items}),
         media_type="application/json",
+        headers=headers,
     )
-    return resp
\ No newline at end of file
+
+
+# =====================
+# Jobs (asíncrono)
+# =====================
+async def _run_job(job: Job) -> dict:
+    cfg = config_store.active()
+    notes = event_log.start()
+    # sin rate limit por cliente (la cola de jobs ya está acotada), pero compite por slots con su prioridad
+    try:
+        result_obj, status, _ = await _invoke_contract(job.message, job.intent, cfg)
+    except HTTPException as e:
+        _log_event("job", job.message, job.intent, cfg, notes, error=e, stages=False)
+        raise
+    _log_event("job", job.message, job.intent, cfg, notes, status=status, result=result_obj, stages=False)
+    _fan_out("job", job.intent, cfg, status, result_obj)
+    return result_obj
+
+
+async def _job_callback(job: Job) -> None:
+    # solo encola: la entrega (reintentos, backoff) la hace _callbacks fuera del worker
+    if not job.callback_url:
+        return
+    queued = _callbacks.enqueue_to(webhooks.CALLBACK_SINK, job.callback_url, {"id": job.id, **job.to_dict()})
+    job.callback_status = "queued" if queued else "dropped"
+
+
+def _job_error(e: BaseException) -> dict:
+    if isinstance(e, HTTPException):
+        return {"status_code": e.status_code, "detail": e.detail}
+    return {"status_code": 500, "detail": {"error": "internal_error", "type": type(e).__name__}}
+
+
+_jobs = JobManager(
+    _run_job,
+    store_path=JOBS_STORE_PATH,
+    workers=JOBS_WORKERS,
+    max_queue=JOBS_MAX_QUEUE,
+    ttl=JOBS_TTL_SECONDS,
+    poll_seconds=JOBS_POLL_SECONDS,
+    lease_seconds=JOBS_LEASE_SECONDS,
+    on_finished=_job_callback,
+    describe_error=_job_error,
+)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: JobReq, x_api_key: str | None = Header(default=None)):
+    _check_api_key(x_api_key)
+
+    if req.callback_url:
+        reason = await webhooks.check_target(req.callback_url)
+        if reason:
+            raise HTTPException(status_code=422, detail={"error": "invalid_callback_url", "reason": reason})
+
+    user_msg = (req.message or "").strip()
+    cfg = config_store.active()
+    intent_pack = _classify_safe(user_msg, cfg)
+    try:
+        job = await _jobs.submit(user_msg, intent_pack, callback_url=req.callback_url)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail={"error": "job_queue_full", "max_queue": JOBS_MAX_QUEUE},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    return Response(
+        content=dumps(job.to_dict()),
+        status_code=202,
+        media_type="application/json",
+        headers={"Location": f"/jobs/{job.id}", "x-config-version": cfg.version},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(default=0, ge=0), x_api_key: str | None = Header(default=None)):
+    """`?wait=N` hace long-poll hasta N segundos (tope JOBS_MAX_WAIT) esperando que termine."""
+    _check_api_key(x_api_key)
+
+    job = await _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "job_not_found"})
+
+    job = await _jobs.wait(job, min(wait, JOBS_MAX_WAIT))
+    return Response(
+        content=dumps(job.to_dict()),
+        media_type="application/json",
+    )
+
+
+# =====================
+# Warm-up
+# =====================
+_WARMUP_MESSAGES = (
+    "hola",
+    "Necesito automatizar leads desde un form de Webflow a HubSpot y avisar en Slack, urgente. Presupuesto USD 800",
+    "Queremos un chatbot de soporte con FAQ sobre Zendesk, prioridad alta",
+    "ETL from Postgres to BigQuery, sync diario, 2000 dolares",
+)
+_WARMUP_ENVELOPE = dumps({
+    "result": dumps({
+        "summary": "warmup",
+        "assumptions": ["a"],
+        "missing_questions": [],
+        "mvp_plan": [{"step": "x", "effort": "1h"}],
+        "risks": [],
+    }).decode("utf-8"),
+})
+
+_warmup_state: dict = {"ready": False, "total_ms": None, "stages_ms": {}, "errors": {}}
+
+
+def _set_ready(value: bool) -> None:
+    if value == _warmup_state["ready"]:
+        return
+    _warmup_state["ready"] = value
+    if value:
+        metrics.READY.inc()
+    else:
+        metrics.READY.dec()
+
+
+async def _warmup_dns() -> None:
+    loop = asyncio.get_running_loop()
+    for base_url in {route.spec.base_url for route in _routes}:
+        parts = urlsplit(base_url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        await loop.getaddrinfo(parts.hostname, port)
+
+
+async def _warmup_connect() -> None:
+    """Abre conexiones keep-alive (TCP+TLS) en el pool de cada ruta hacia Xpander."""
+    # en paralelo para que sean conexiones distintas; el status no importa (404/401 sirve igual)
+    await asyncio.gather(*(
+        route.client().head(route.spec.base_url)
+        for route in _routes
+        for _ in range(min(WARMUP_CONNECTIONS, route.spec.max_connections))
+    ))
+
+
+def _warmup_local() -> None:
+    """Primer uso de las rutas locales: clasificador, short-circuit, JSON, parser de stream, índice."""
+    cfg = config_store.active()
+    for message in _WARMUP_MESSAGES:
+        pack = classify_intent_and_score(message, cfg.classifier)
+        cfg.short_circuit.match(pack)
+        _near_dups.sketch(message)
+    contract = decode_response(200, _WARMUP_ENVELOPE)
+    dumps(contract)
+    parser = ContractStream()
+    parser.feed(_WARMUP_ENVELOPE.decode("utf-8"))
+    parser.take_text()
+
+
+async def _warmup() -> None:
+    t0 = time.perf_counter()
+    stages = _warmup_state["stages_ms"]
+    errors = _warmup_state["errors"]
+
+    t = time.perf_counter()
+    try:
+        _warmup_local()
+    except Exception as e:  # no debería pasar; no dejamos al worker afuera por esto
+        errors["local"] = f"{type(e).__name__}: {e}"[:300]
+    stages["local"] = round((time.perf_counter() - t) * 1000, 2)
+
+    if WARMUP_CONNECTIONS > 0:
+        for name, step in (("dns", _warmup_dns), ("connect", _warmup_connect)):
+            t = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(), WARMUP_TIMEOUT)
+            except Exception as e:
+                # Xpander caído no es motivo para no atender: short-circuit, cache y breaker siguen andando
+                errors[name] = f"{type(e).__name__}: {e}"[:300]
+            stages[name] = round((time.perf_counter() - t) * 1000, 2)
+
+    _warmup_state["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    _set_ready(True)
+    print("[warmup] listo en", _warmup_state["total_ms"], "ms", stages, errors or "")
+
+
+# lo importado queda fuera de las colecciones futuras (menos trabajo por pausa de GC);
+# antes se junta la basura del import para no congelarla también
+gc.collect()
+gc.freeze()
@@ -0,0 +1,155 @@
+"""
+Microbenchmark del clasificador determinístico.
+
+    python -m bench.bench_classifier
+
+1) Verifica que `classify_intent_and_score` devuelve exactamente lo mismo que
+   la implementación original (un `in` por keyword, las vagas por palabra
+   completa, + SCOPE_PATTERNS).
+2) Mide latencia por llamada con mensajes típicos y con inputs adversariales
+   largos, y chequea que el costo crezca linealmente con el largo.
+"""
+import random
+import re
+import sys
+import time
+
+from bench.corpus import FALLBACK, load_messages
+from intent_classifier import (
+    BUDGET_RE,
+    SCOPE_PATTERNS,
+    STACK_KEYWORDS,
+    classify_intent_and_score,
+    classify_many,
+)
+from intent_config import INTENTS, SCORING_RULES, URGENCY_KEYWORDS, VAGUE_KEYWORDS
+
+
+# ---------------------------------------------------------------------
+# Implementación de referencia (la original, sin compilar)
+# ---------------------------------------------------------------------
+def _contains_any(text, keywords):
+    return [k for k in keywords if k and k.lower() in text]
+
+
+def _contains_words(text, keywords):
+    return [k for k in keywords if k and re.search(r"\b" + re.escape(k.lower()) + r"\b", text)]
+
+
+def legacy_classify(message):
+    text = (message or "").strip().lower()
+    best = ("other", "Otro / No clasificado", 0, [])
+    for intent in INTENTS:
+        kws = [k.lower() for k in intent.get("keywords", [])]
+        hits = _contains_any(text, kws)
+        if len(hits) > best[2]:
+            best = (intent["id"], intent["label"], len(hits), hits)
+    intent_id, intent_label, _, intent_hits = best
+
+    score = 0
+    reasons = []
+    vague_hits = _contains_words(text, VAGUE_KEYWORDS)
+    if vague_hits:
+        score += SCORING_RULES["is_vague_penalty"]
+        reasons.append(f"vague_penalty({', '.join(vague_hits)})")
+    if BUDGET_RE.search(text):
+        score += SCORING_RULES["has_budget"]
+        reasons.append("has_budget")
+    urg_hits = _contains_any(text, URGENCY_KEYWORDS)
+    if urg_hits:
+        score += SCORING_RULES["has_urgency"]
+        reasons.append(f"has_urgency({', '.join(urg_hits)})")
+    stack_hits = _contains_any(text, STACK_KEYWORDS)
+    if stack_hits:
+        score += SCORING_RULES["has_stack"]
+        reasons.append(f"has_stack({', '.join(sorted(set(stack_hits)))})")
+    for name, rx in SCOPE_PATTERNS:
+        if rx.search(text):
+            reasons.append(f"has_scope({name})")
+            score += SCORING_RULES["has_scope"]
+            break
+    if intent_id != "other" and intent_hits:
+        score += min(10, 2 * len(intent_hits))
+        reasons.append(f"intent_signal({', '.join(intent_hits)})")
+    score = max(0, min(100, score))
+    return {"intent": {"id": intent_id, "label": intent_label}, "score": score, "reasons": reasons}
+
+
+# ---------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------
+TYPICAL = FALLBACK
+
+_VOCAB = sorted(
+    {k for it in INTENTS for k in it["keywords"]}
+    | set(URGENCY_KEYWORDS) | set(VAGUE_KEYWORDS) | set(STACK_KEYWORDS)
+    | {"desde", "from", "a", "to", "integrar", "integración", "automatizar", "workflow",
+       "usd", "$", "500", "dólares", "playa", "rapido", "leadership", "\n", "de", "y"}
+)
+
+
+def _random_messages(n, seed=7):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rnd.choice(_VOCAB) for _ in range(rnd.randint(0, 30))]
+        sep = rnd.choice([" ", "", "  ", ", "])
+        msg = sep.join(words)
+        if rnd.random() < 0.3:
+            msg = msg.upper()
+        out.append(msg)
+    return out
+
+
+def _adversarial(size):
+    # "desde" repetido sin "a"/"to": cuadrático con el `.+` original
+    return {
+        "desde_no_to": ("desde " * (size // 6))[:size],
+        "keyword_prefixes": ("lead" * (size // 4))[:size],
+        "digits_no_currency": ("9" * size),
+        "all_keywords": (" ".join(_VOCAB) + " ") * max(1, size // 400),
+    }
+
+
+def _per_call_us(fn, arg, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    corpus = TYPICAL + _random_messages(5000) + load_messages(argv[0] if argv else "requests.jsonl")
+
+    mismatches = [m for m in corpus if classify_intent_and_score(m) != legacy_classify(m)]
+    print(f"equivalence: {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+    for m in mismatches[:5]:
+        print("  MISMATCH:", repr(m[:120]))
+    assert classify_many(corpus[:50]) == [legacy_classify(m) for m in corpus[:50]]
+
+    print("\ntypical messages (us/call)    compiled     legacy")
+    for msg in TYPICAL:
+        new = _per_call_us(classify_intent_and_score, msg, 2000)
+        old = _per_call_us(legacy_classify, msg, 2000)
+        print(f"  {msg[:28]!r:32} {new:9.1f}  {old:9.1f}")
+
+    print("\nadversarial inputs (us/call)")
+    sizes = (1_000, 10_000, 100_000)
+    for name in _adversarial(1000):
+        row = []
+        for size in sizes:
+            msg = _adversarial(size)[name]
+            repeat = max(3, 200_000 // size)
+            new = _per_call_us(classify_intent_and_score, msg, repeat)
+            old = _per_call_us(legacy_classify, msg, max(1, repeat // 10)) if size <= 10_000 else float("nan")
+            row.append((size, new, old))
+        cells = "  ".join(f"{s:>7}: {n:9.1f} (legacy {o:9.1f})" for s, n, o in row)
+        growth = row[-1][1] / max(row[0][1], 1e-9) / (sizes[-1] / sizes[0])
+        print(f"  {name:20} {cells}  growth/linear={growth:.2f}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
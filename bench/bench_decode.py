@@ -0,0 +1,109 @@
+"""
+Benchmark del decode de respuestas de Xpander (envelope -> contract).
+
+    python -m bench.bench_decode
+
+Compara `contract.decode_response` (una pasada, orjson si está instalado)
+contra el camino original (json.loads + find/rfind + doble extract + json.dumps)
+con envelopes grandes, `result` escapado y bodies malformados.
+"""
+import json
+import time
+
+import contract
+from contract import decode_response, dumps
+
+
+# ---------------------------------------------------------------------
+# Camino original (referencia)
+# ---------------------------------------------------------------------
+def _legacy_parse(text):
+    t = text.strip()
+    try:
+        obj = json.loads(t)
+        return obj if isinstance(obj, dict) else {"error": "non_object_json"}
+    except Exception:
+        start, end = t.find("{"), t.rfind("}")
+        if start != -1 and end > start:
+            try:
+                obj = json.loads(t[start:end + 1])
+                return obj if isinstance(obj, dict) else {"error": "non_object_json"}
+            except Exception:
+                pass
+        return {"error": "non_json_response"}
+
+
+def _legacy_extract(envelope):
+    raw = envelope.get("result")
+    if isinstance(raw, dict):
+        return raw
+    return json.loads(raw)
+
+
+def legacy_decode(body: bytes) -> bytes:
+    envelope = _legacy_parse(body.decode("utf-8"))
+    if envelope.get("error"):
+        raise ValueError(envelope["error"])
+    _legacy_extract(envelope)
+    result = contract.normalize_contract(_legacy_extract(envelope))
+    return json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+
+def new_decode(body: bytes) -> bytes:
+    return dumps(decode_response(200, body))
+
+
+# ---------------------------------------------------------------------
+# Casos
+# ---------------------------------------------------------------------
+def _contract(n_items, text_len):
+    filler = ("automatizar leads de hubspot a slack con \"comillas\" y ñ " * (text_len // 50 + 1))[:text_len]
+    return {
+        "summary": filler,
+        "assumptions": [f"{filler[:80]} #{i}" for i in range(n_items)],
+        "missing_questions": [f"¿pregunta {i}?" for i in range(n_items)],
+        "mvp_plan": [{"step": f"paso {i} {filler[:60]}", "effort": "2h"} for i in range(n_items)],
+        "risks": [f"riesgo {i}" for i in range(n_items)],
+        "debug": {"trace": [filler[:200]] * n_items},
+    }
+
+
+def cases():
+    small = _contract(5, 200)
+    large = _contract(500, 20_000)
+    meta = {"id": "exec-1", "status": "completed", "logs": ["x" * 500] * 50}
+    yield "small/result-string", json.dumps({**meta, "result": json.dumps(small)}).encode()
+    yield "large/result-string", json.dumps({**meta, "result": json.dumps(large)}).encode()
+    yield "large/result-object", json.dumps({**meta, "result": large}).encode()
+    yield "large/prose+fenced", (
+        "Claro! Acá está la respuesta {no json}:\n```json\n"
+        + json.dumps({**meta, "result": json.dumps(large)})
+        + "\n```\nSaludos {;}"
+    ).encode()
+
+
+def _per_call_ms(fn, arg, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - t0) / repeat * 1e3
+
+
+def main():
+    print(f"backend: {'orjson' if contract.orjson is not None else 'stdlib json'}")
+    print(f"{'case':24} {'bytes':>9} {'new ms':>9} {'legacy ms':>10}")
+    for name, body in cases():
+        repeat = 2000 if len(body) < 50_000 else 30
+        new = _per_call_ms(new_decode, body, repeat)
+        try:
+            old = f"{_per_call_ms(legacy_decode, body, repeat):10.3f}"
+        except ValueError as e:
+            old = f"{'fail:' + str(e)[:14]:>10}"
+        print(f"{name:24} {len(body):9d} {new:9.3f} {old}")
+        assert json.loads(new_decode(body)) == contract.normalize_contract(
+            contract.extract_agent_result(contract.find_json_object(body.decode()))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Carga de corpus de mensajes para benchmarks (JSONL tipo `requests.jsonl`)."""
+import json
+from pathlib import Path
+from typing import List
+
+FALLBACK = [
+    "hola",
+    "ping",
+    "Necesito automatizar leads desde un form de Webflow a HubSpot y avisar en Slack, urgente. Presupuesto USD 800",
+    "Queremos un chatbot de soporte con FAQ sobre Zendesk, prioridad alta",
+    "ETL from Postgres to BigQuery, sync diario, 2000 dolares",
+    "integrar braze con segment y appsflyer para attribution de ads",
+]
+
+
+def load_messages(path: str = "requests.jsonl") -> List[str]:
+    """Un mensaje por línea: `message`, o `title` + `body`. Si no hay archivo, FALLBACK."""
+    p = Path(path)
+    if not p.exists():
+        return list(FALLBACK)
+    out = []
+    with p.open(encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            if isinstance(obj.get("message"), str):
+                out.append(obj["message"])
+                continue
+            text = " ".join(obj[k] for k in ("title", "body") if isinstance(obj.get(k), str))
+            if text:
+                out.append(text)
+    return out or list(FALLBACK)
@@ -0,0 +1,79 @@
+"""
+Costo de import de `app.py` (lo que paga cada worker al arrancar).
+
+    python -m bench.import_time [--runs 5] [--max-ms 400]
+
+Corre `python -X importtime -c "import app"` en procesos nuevos y muestra la
+mediana del total y de los módulos del repo (self = sin contar sus imports).
+Con `--max-ms` sale con error si la mediana supera el presupuesto.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _own_modules():
+    return {p.stem for p in ROOT.glob("*.py")}
+
+
+def measure(module: str = "app"):
+    """(total_us, {modulo: (self_us, cumulative_us)}) de un import en un proceso limpio."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        # sin multiproceso: prometheus_client mira si la variable existe (vacía = escribe en el cwd)
+        env={k: v for k, v in os.environ.items() if k.lower() != "prometheus_multiproc_dir"},
+    ).stderr
+    mods = {}
+    for line in out.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            mods[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return mods[module][1], mods
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--max-ms", type=float, default=None)
+    ap.add_argument("--module", default="app")
+    args = ap.parse_args(argv)
+
+    own = _own_modules()
+    totals = []
+    per_mod = defaultdict(list)
+    for _ in range(args.runs):
+        total, mods = measure(args.module)
+        totals.append(total)
+        for name, (self_us, cum_us) in mods.items():
+            top = name.split(".")[0]
+            if name in own or top in ("fastapi", "pydantic", "httpx", "prometheus_client", "orjson", "starlette"):
+                per_mod[name].append((self_us, cum_us))
+
+    total_ms = statistics.median(totals) / 1000
+    print(f"import {args.module}: {total_ms:.1f} ms (mediana de {args.runs})")
+    rows = sorted(
+        ((name, statistics.median(s for s, _ in v) / 1000, statistics.median(c for _, c in v) / 1000)
+         for name, v in per_mod.items() if name in own or "." not in name),
+        key=lambda r: -r[2],
+    )
+    print(f"  {'módulo':24} {'self ms':>9} {'total ms':>9}")
+    for name, self_ms, cum_ms in rows:
+        print(f"  {name:24} {self_ms:9.2f} {cum_ms:9.2f}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"FAIL: {total_ms:.1f} ms > presupuesto {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+"""
+Load test end-to-end: mock de Xpander + `uvicorn app:app` + clientes concurrentes.
+
+    python -m bench.load_test --requests 2000 --concurrency 32 --latency lognormal:300,0.4
+
+Levanta `bench.mock_xpander` y la app (apuntando XPANDER_BASE_URL al mock)
+en puertos libres, reproduce el corpus (`requests.jsonl` por default) contra
+`/invoke` y reporta throughput, p50/p95/p99 y distribución de status/x-cache.
+
+Para CI: `--max-p95-ms` / `--min-rps` hacen que salga con código 1 si no se cumplen.
+
+`--webhooks N` configura N sinks de webhook contra el mock (alternando arrays
+de 50 y de a uno) y, al terminar, espera a que lleguen todos los resultados:
+sirve para comparar la latencia con y sin fan-out y ver que no se pierde nada.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import httpx
+
+from bench.corpus import load_messages
+from bench.mock_xpander import MockConfig
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    k = (len(sorted_vals) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"proceso terminó antes de estar listo ({url})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"timeout esperando {url}")
+
+
+def start_mock(cfg: MockConfig, port: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "bench.mock_xpander", "--port", str(port)]
+    proc = subprocess.Popen(cmd, env={**os.environ, **cfg.to_env()})
+    wait_ready(f"http://127.0.0.1:{port}/health", proc)
+    return proc
+
+
+def start_app(port: int, mock_port: int, workers: int, extra_env: Optional[dict] = None) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "XPANDER_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "XPANDER_API_KEY": "bench",
+        "INTAKE_API_KEY": "",
+        **(extra_env or {}),
+    }
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+    proc = subprocess.Popen(cmd, env=env)
+    wait_ready(f"http://127.0.0.1:{port}/ready", proc)
+    return proc
+
+
+def webhook_sinks(mock_port: int, n: int) -> List[dict]:
+    return [
+        {"name": f"sink{i}", "url": f"http://127.0.0.1:{mock_port}/webhooks/sink{i}", "batch": 50 if i % 2 == 0 else 1}
+        for i in range(n)
+    ]
+
+
+def wait_webhooks(mock_port: int, sinks: List[dict], expected: int, timeout: float) -> dict:
+    """Espera hasta que cada sink recibió `expected` items distintos (o vence `timeout`)."""
+    t0 = time.monotonic()
+    while True:
+        got = {s["name"]: httpx.get(f"http://127.0.0.1:{mock_port}/webhooks/{s['name']}").json() for s in sinks}
+        done = all(g["unique"] >= expected for g in got.values())
+        if done or time.monotonic() - t0 > timeout:
+            return {
+                "expected": expected,
+                "complete": done,
+                "drain_seconds": round(time.monotonic() - t0, 2),
+                "sinks": {name: {k: g[k] for k in ("unique", "items", "posts", "failed")} for name, g in got.items()},
+            }
+        time.sleep(0.2)
+
+
+async def drive(base_url: str, endpoint: str, messages: List[str], total: int, concurrency: int, timeout: float) -> dict:
+    latencies: List[float] = []
+    statuses = collections.Counter()
+    cache = collections.Counter()
+    counter = iter(range(total))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            for i in counter:
+                msg = messages[i % len(messages)]
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(endpoint, json={"message": msg})
+                    statuses[r.status_code] += 1
+                    cache[r.headers.get("x-cache", "-")] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(lat, 0.50), 1),
+        "p95_ms": round(percentile(lat, 0.95), 1),
+        "p99_ms": round(percentile(lat, 0.99), 1),
+        "max_ms": round(lat[-1], 1) if lat else None,
+        "status": {str(k): v for k, v in statuses.items()},
+        "x_cache": dict(cache),
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--corpus", default="requests.jsonl")
+    p.add_argument("--endpoint", default="/invoke")
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--workers", type=int, default=2, help="workers de uvicorn (como en el Dockerfile)")
+    p.add_argument("--timeout", type=float, default=90.0)
+    p.add_argument("--cache", action="store_true", help="dejar la cache de resultados y de similares activa (default: off)")
+    p.add_argument("--latency", default="lognormal:300,0.4")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--timeout-rate", type=float, default=0.0)
+    p.add_argument("--malformed-rate", type=float, default=0.0)
+    p.add_argument("--escaped-rate", type=float, default=0.8)
+    p.add_argument("--webhooks", type=int, default=0, help="cantidad de sinks de webhook contra el mock (0 = sin fan-out)")
+    p.add_argument("--webhook-error-rate", type=float, default=0.0)
+    p.add_argument("--webhook-wait", type=float, default=60.0, help="segundos máx esperando que se entreguen los webhooks")
+    p.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="env extra para la app")
+    p.add_argument("--json", action="store_true", help="imprimir el reporte como JSON")
+    p.add_argument("--max-p95-ms", type=float)
+    p.add_argument("--min-rps", type=float)
+    a = p.parse_args(argv)
+
+    messages = load_messages(a.corpus)
+    mock_cfg = MockConfig(
+        latency=a.latency,
+        error_rate=a.error_rate,
+        timeout_rate=a.timeout_rate,
+        malformed_rate=a.malformed_rate,
+        escaped_rate=a.escaped_rate,
+        webhook_error_rate=a.webhook_error_rate,
+    )
+    app_env = dict(kv.split("=", 1) for kv in a.app_env)
+    if not a.cache:
+        app_env.setdefault("CACHE_TTL_SECONDS", "0")
+        app_env.setdefault("SIMILARITY_THRESHOLD", "0")
+
+    mock_port, app_port = free_port(), free_port()
+    procs = []
+    tmp = tempfile.TemporaryDirectory(prefix="load_test-")
+    sinks = webhook_sinks(mock_port, a.webhooks)
+    if sinks:
+        sinks_path = os.path.join(tmp.name, "webhooks.json")
+        with open(sinks_path, "w") as fh:
+            json.dump(sinks, fh)
+        app_env.setdefault("WEBHOOKS_PATH", sinks_path)
+        app_env.setdefault("WEBHOOKS_SPOOL_PATH", os.path.join(tmp.name, "spool.db"))
+        app_env.setdefault("WEBHOOKS_BACKOFF_BASE", "0.2")
+    try:
+        procs.append(start_mock(mock_cfg, mock_port))
+        procs.append(start_app(app_port, mock_port, a.workers, app_env))
+        report = asyncio.run(drive(f"http://127.0.0.1:{app_port}", a.endpoint, messages, a.requests, a.concurrency, a.timeout))
+        if sinks:
+            report["webhooks"] = wait_webhooks(mock_port, sinks, report["status"].get("200", 0), a.webhook_wait)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        tmp.cleanup()
+
+    report = {"endpoint": a.endpoint, "concurrency": a.concurrency, "workers": a.workers, "mock": mock_cfg.__dict__, **report}
+    if a.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{a.endpoint}  {report['requests']} req  c={a.concurrency}  workers={a.workers}  mock={a.latency}")
+        print(f"  throughput: {report['rps']} req/s ({report['seconds']} s)")
+        print(f"  latency ms: p50={report['p50_ms']}  p95={report['p95_ms']}  p99={report['p99_ms']}  max={report['max_ms']}")
+        print(f"  status: {report['status']}  x-cache: {report['x_cache']}")
+        if "webhooks" in report:
+            wh = report["webhooks"]
+            print(f"  webhooks: {'completos' if wh['complete'] else 'INCOMPLETOS'} en {wh['drain_seconds']} s  {wh['sinks']}")
+
+    failed = False
+    if a.max_p95_ms is not None and not report["p95_ms"] <= a.max_p95_ms:
+        print(f"FAIL: p95 {report['p95_ms']} ms > {a.max_p95_ms} ms")
+        failed = True
+    if a.min_rps is not None and not report["rps"] >= a.min_rps:
+        print(f"FAIL: {report['rps']} req/s < {a.min_rps} req/s")
+        failed = True
+    if "webhooks" in report and not report["webhooks"]["complete"]:
+        print(f"FAIL: webhooks sin entregar después de {a.webhook_wait} s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
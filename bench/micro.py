@@ -0,0 +1,60 @@
+"""
+Microbenchmarks de las etapas locales del hot path (sin red).
+
+    python -m bench.micro [corpus.jsonl]
+
+- `classify_intent_and_score` sobre el corpus
+- `normalize_contract` sobre contracts chicos / grandes / mal tipados
+"""
+import sys
+import time
+
+from bench.corpus import load_messages
+from contract import normalize_contract
+from intent_classifier import classify_intent_and_score
+
+
+def _bench(name, fn, args, min_seconds=0.5):
+    n, t0 = 0, time.perf_counter()
+    while True:
+        for a in args:
+            fn(a)
+        n += len(args)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds:
+            break
+    print(f"  {name:34} {elapsed / n * 1e6:9.2f} us/call  ({n} calls)")
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    messages = load_messages(argv[0] if argv else "requests.jsonl")
+
+    print(f"classifier ({len(messages)} mensajes)")
+    _bench("classify_intent_and_score", classify_intent_and_score, messages)
+
+    small = {
+        "summary": " Automatizar leads ",
+        "assumptions": ["a", "", None],
+        "missing_questions": "¿volumen?",
+        "mvp_plan": [{"step": "x", "effort": "1h"}, "y", {"effort": "2d"}],
+        "risks": [],
+    }
+    large = {
+        "summary": "s" * 5000,
+        "assumptions": [f"supuesto {i}" for i in range(200)],
+        "missing_questions": [f"¿pregunta {i}?" for i in range(200)],
+        "mvp_plan": [{"step": f"paso {i}", "effort": "2h"} for i in range(200)],
+        "risks": [f"riesgo {i}" for i in range(200)],
+        "extra": {"ignored": True},
+    }
+    wrong_types = {"summary": 123, "assumptions": {"a": 1}, "mvp_plan": "texto", "risks": [1, 2.5, None]}
+
+    print("normalize_contract")
+    _bench("small", normalize_contract, [small])
+    _bench("large (200 items/campo)", normalize_contract, [large])
+    _bench("wrong types", normalize_contract, [wrong_types])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Stand-in local de la API de invoke de Xpander, para benchmarks y load tests.
+
+    python -m bench.mock_xpander --port 9100 --latency lognormal:800,0.5 --error-rate 0.02
+
+Responde cualquier `POST .../invoke` con un envelope `{"result": ...}`. Se puede
+configurar la distribución de latencia, la tasa de errores 5xx, de timeouts,
+de bodies malformados (texto alrededor / no-JSON) y de `result` como string
+JSON escapado vs objeto.
+
+Latencias (ms): `fixed:300`, `uniform:100,900`, `normal:500,150`,
+`lognormal:<mediana>,<sigma>`.
+
+También hace de sink de webhooks (ver webhooks.py): `POST /webhooks/<name>`
+acepta un objeto o un array, guarda lo recibido y falla con 503 según
+`--webhook-error-rate`; `GET /webhooks/<name>` devuelve lo recibido (ids y
+cantidad de POSTs), `DELETE /webhooks/<name>` lo limpia.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+
+@dataclass
+class MockConfig:
+    latency: str = "lognormal:500,0.4"
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 120.0
+    malformed_rate: float = 0.0
+    escaped_rate: float = 0.8
+    seed: int = 0
+    webhook_error_rate: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency=os.getenv("MOCK_LATENCY", cls.latency),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", cls.error_rate)),
+            timeout_rate=float(os.getenv("MOCK_TIMEOUT_RATE", cls.timeout_rate)),
+            timeout_seconds=float(os.getenv("MOCK_TIMEOUT_SECONDS", cls.timeout_seconds)),
+            malformed_rate=float(os.getenv("MOCK_MALFORMED_RATE", cls.malformed_rate)),
+            escaped_rate=float(os.getenv("MOCK_ESCAPED_RATE", cls.escaped_rate)),
+            seed=int(os.getenv("MOCK_SEED", cls.seed)),
+            webhook_error_rate=float(os.getenv("MOCK_WEBHOOK_ERROR_RATE", cls.webhook_error_rate)),
+        )
+
+    def to_env(self) -> dict:
+        return {
+            "MOCK_LATENCY": self.latency,
+            "MOCK_ERROR_RATE": str(self.error_rate),
+            "MOCK_TIMEOUT_RATE": str(self.timeout_rate),
+            "MOCK_TIMEOUT_SECONDS": str(self.timeout_seconds),
+            "MOCK_MALFORMED_RATE": str(self.malformed_rate),
+            "MOCK_ESCAPED_RATE": str(self.escaped_rate),
+            "MOCK_SEED": str(self.seed),
+            "MOCK_WEBHOOK_ERROR_RATE": str(self.webhook_error_rate),
+        }
+
+
+def latency_sampler(spec: str, rnd: random.Random):
+    """`spec` -> función que devuelve segundos."""
+    kind, _, args = spec.partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()]
+    if kind == "fixed":
+        return lambda: vals[0] / 1000
+    if kind == "uniform":
+        return lambda: rnd.uniform(vals[0], vals[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, rnd.gauss(vals[0], vals[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(vals[0])
+        return lambda: rnd.lognormvariate(mu, vals[1]) / 1000
+    raise ValueError(f"latency spec inválida: {spec!r}")
+
+
+def _contract_for(text: str) -> dict:
+    return {
+        "summary": f"Resumen de: {text[:200]}",
+        "assumptions": ["El cliente ya tiene cuentas en las herramientas mencionadas"],
+        "missing_questions": ["¿Qué volumen mensual esperan?", "¿Quién mantiene la integración?"],
+        "mvp_plan": [
+            {"step": "Relevar campos y eventos", "effort": "2h"},
+            {"step": "Armar el workflow", "effort": "1d"},
+        ],
+        "risks": ["Rate limits de las APIs"],
+    }
+
+
+def create_app(cfg: MockConfig) -> FastAPI:
+    rnd = random.Random(cfg.seed)
+    sample_latency = latency_sampler(cfg.latency, rnd)
+    webhook_rnd = random.Random(cfg.seed + 1)  # aparte: no cambia la secuencia de /invoke
+    app = FastAPI()
+    app.state.stats = {"requests": 0}
+    app.state.webhooks = {}  # name -> {"posts": n, "failed": n, "ids": [...]}
+
+    @app.get("/health")
+    def health():
+        return {"ok": True, **app.state.stats}
+
+    @app.post("/{path:path}/invoke")
+    async def invoke(path: str, request: Request):
+        app.state.stats["requests"] += 1
+        body = await request.json()
+        text = ((body.get("input") or {}).get("text")) or ""
+
+        roll = rnd.random()
+        if roll < cfg.timeout_rate:
+            await asyncio.sleep(cfg.timeout_seconds)
+        await asyncio.sleep(sample_latency())
+
+        roll = rnd.random()
+        if roll < cfg.error_rate:
+            return Response("upstream exploded", status_code=500, media_type="text/plain")
+        roll -= cfg.error_rate
+        if roll < cfg.malformed_rate:
+            if rnd.random() < 0.5:
+                return Response("<html>502 Bad Gateway</html>", media_type="text/html")
+            envelope = json.dumps({"id": "exec", "result": _contract_for(text)})
+            return Response(f"Respuesta del agente:\n```json\n{envelope}\n```", media_type="text/plain")
+
+        contract = _contract_for(text)
+        result = json.dumps(contract, ensure_ascii=False) if rnd.random() < cfg.escaped_rate else contract
+        envelope = {"id": "exec", "status": "completed", "result": result}
+        return Response(json.dumps(envelope, ensure_ascii=False), media_type="application/json")
+
+    @app.post("/webhooks/{name}")
+    async def webhook(name: str, request: Request):
+        sink = app.state.webhooks.setdefault(name, {"posts": 0, "failed": 0, "ids": []})
+        sink["posts"] += 1
+        if webhook_rnd.random() < cfg.webhook_error_rate:
+            sink["failed"] += 1
+            return Response("sink down", status_code=503, media_type="text/plain", headers={"Retry-After": "1"})
+        body = await request.json()
+        items = body if isinstance(body, list) else [body]
+        sink["ids"].extend(item.get("id") for item in items)
+        return {"ok": True, "received": len(items)}
+
+    @app.get("/webhooks/{name}")
+    def webhook_received(name: str):
+        sink = app.state.webhooks.get(name, {"posts": 0, "failed": 0, "ids": []})
+        return {**sink, "items": len(sink["ids"]), "unique": len(set(sink["ids"]))}
+
+    @app.delete("/webhooks/{name}")
+    def webhook_reset(name: str):
+        app.state.webhooks.pop(name, None)
+        return {"ok": True}
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    defaults = MockConfig.from_env()
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--latency", default=defaults.latency)
+    p.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    p.add_argument("--timeout-rate", type=float, default=defaults.timeout_rate)
+    p.add_argument("--timeout-seconds", type=float, default=defaults.timeout_seconds)
+    p.add_argument("--malformed-rate", type=float, default=defaults.malformed_rate)
+    p.add_argument("--escaped-rate", type=float, default=defaults.escaped_rate)
+    p.add_argument("--seed", type=int, default=defaults.seed)
+    p.add_argument("--webhook-error-rate", type=float, default=defaults.webhook_error_rate)
+    a = p.parse_args(argv)
+    cfg = MockConfig(
+        a.latency, a.error_rate, a.timeout_rate, a.timeout_seconds, a.malformed_rate, a.escaped_rate, a.seed,
+        a.webhook_error_rate,
+    )
+    uvicorn.run(create_app(cfg), host=a.host, port=a.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
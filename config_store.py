@@ -0,0 +1,289 @@
+# config_store.py
+"""
+Config de intents/scoring cargada desde un archivo JSON, con hot-reload.
+
+- `INTENT_CONFIG_PATH` apunta al archivo (sin setear: defaults de `intent_config.py`).
+- El archivo se valida y se compila (regex del clasificador, contracts de
+  short-circuit) en un thread, fuera del hot path; recién entonces se hace el
+  swap atómico de la referencia activa. Un archivo inválido nunca reemplaza a
+  la config que está andando.
+- Cada worker de uvicorn vigila el mtime del mismo archivo; la versión es un
+  hash del contenido validado, así que todos los workers reportan la misma.
+
+    python -m config_store --dump > intent_config.json   # defaults como JSON
+    python -m config_store --check intent_config.json    # validar antes de deployar
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import intent_config
+from intent_classifier import STACK_KEYWORDS, CompiledConfig, compile_config, set_active_config
+from short_circuit import ShortCircuitPolicy
+
+INTENT_CONFIG_PATH = os.getenv("INTENT_CONFIG_PATH", "").strip()
+INTENT_CONFIG_POLL_SECONDS = float(os.getenv("INTENT_CONFIG_POLL_SECONDS", "5"))
+
+_SCORING_KEYS = ("has_budget", "has_urgency", "has_stack", "has_scope", "is_vague_penalty")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def default_config() -> Dict[str, Any]:
+    return {
+        "intents": intent_config.INTENTS,
+        "scoring_rules": intent_config.SCORING_RULES,
+        "urgency_keywords": intent_config.URGENCY_KEYWORDS,
+        "vague_keywords": intent_config.VAGUE_KEYWORDS,
+        "stack_keywords": STACK_KEYWORDS,
+        "short_circuit": intent_config.SHORT_CIRCUIT_POLICY,
+        "short_circuit_summary": intent_config.SHORT_CIRCUIT_SUMMARY,
+        "missing_questions_templates": intent_config.MISSING_QUESTIONS_TEMPLATES,
+    }
+
+
+# =====================
+# Validación
+# =====================
+def _str_list(value: Any, where: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(x, str) for x in value):
+        raise ConfigError(f"{where}: se espera una lista de strings")
+    return list(value)
+
+
+def validate(raw: Any) -> Dict[str, Any]:
+    """Valida y completa con defaults las keys que falten. Levanta ConfigError."""
+    if not isinstance(raw, dict):
+        raise ConfigError("la config tiene que ser un objeto JSON")
+    defaults = default_config()
+    unknown = set(raw) - set(defaults)
+    if unknown:
+        raise ConfigError(f"keys desconocidas: {', '.join(sorted(unknown))}")
+    cfg = {**defaults, **raw}
+
+    intents = cfg["intents"]
+    if not isinstance(intents, list) or not intents:
+        raise ConfigError("intents: se espera una lista no vacía")
+    seen = set()
+    clean_intents = []
+    for i, it in enumerate(intents):
+        if not isinstance(it, dict) or not isinstance(it.get("id"), str) or not it["id"].strip():
+            raise ConfigError(f"intents[{i}]: falta `id`")
+        if it["id"] in seen:
+            raise ConfigError(f"intents[{i}]: id duplicado {it['id']!r}")
+        seen.add(it["id"])
+        if not isinstance(it.get("label", ""), str):
+            raise ConfigError(f"intents[{i}].label: se espera string")
+        clean_intents.append({
+            "id": it["id"],
+            "label": it.get("label", it["id"]),
+            "keywords": _str_list(it.get("keywords", []), f"intents[{i}].keywords"),
+        })
+    cfg["intents"] = clean_intents
+
+    rules = cfg["scoring_rules"]
+    if not isinstance(rules, dict):
+        raise ConfigError("scoring_rules: se espera un objeto")
+    missing = [k for k in _SCORING_KEYS if k not in rules]
+    if missing:
+        raise ConfigError(f"scoring_rules: faltan {', '.join(missing)}")
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in rules.values()):
+        raise ConfigError("scoring_rules: los valores tienen que ser enteros")
+
+    for key in ("urgency_keywords", "vague_keywords", "stack_keywords"):
+        cfg[key] = _str_list(cfg[key], key)
+
+    sc = cfg["short_circuit"]
+    if not isinstance(sc, dict):
+        raise ConfigError("short_circuit: se espera un objeto")
+    if not isinstance(sc.get("max_score", 0), int):
+        raise ConfigError("short_circuit.max_score: se espera entero")
+    _str_list(sc.get("intents", []), "short_circuit.intents")
+    _str_list(sc.get("reasons", []), "short_circuit.reasons")
+
+    if not isinstance(cfg["short_circuit_summary"], str):
+        raise ConfigError("short_circuit_summary: se espera string")
+    templates = cfg["missing_questions_templates"]
+    if not isinstance(templates, dict):
+        raise ConfigError("missing_questions_templates: se espera un objeto")
+    for intent_id, questions in templates.items():
+        _str_list(questions, f"missing_questions_templates.{intent_id}")
+
+    return cfg
+
+
+def config_version(cfg: Dict[str, Any]) -> str:
+    canonical = json.dumps(cfg, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+# =====================
+# Config activa
+# =====================
+@dataclass(frozen=True)
+class ActiveConfig:
+    version: str
+    source: str
+    loaded_at: float
+    classifier: CompiledConfig
+    short_circuit: ShortCircuitPolicy
+
+
+def _env_csv(name: str) -> Optional[List[str]]:
+    raw = os.getenv(name)
+    return None if raw is None else [x.strip() for x in raw.split(",") if x.strip()]
+
+
+def _short_circuit_env_overrides() -> Dict[str, Any]:
+    """Env vars SHORT_CIRCUIT_* pisan lo que diga el archivo (útil para apagarlo rápido)."""
+    out: Dict[str, Any] = {}
+    if os.getenv("SHORT_CIRCUIT_ENABLED") is not None:
+        out["enabled"] = os.getenv("SHORT_CIRCUIT_ENABLED", "").strip().lower() in ("1", "true", "yes")
+    if os.getenv("SHORT_CIRCUIT_MAX_SCORE") is not None:
+        out["max_score"] = int(os.getenv("SHORT_CIRCUIT_MAX_SCORE", "0"))
+    if _env_csv("SHORT_CIRCUIT_INTENTS") is not None:
+        out["intents"] = _env_csv("SHORT_CIRCUIT_INTENTS")
+    if _env_csv("SHORT_CIRCUIT_REASONS") is not None:
+        out["reasons"] = _env_csv("SHORT_CIRCUIT_REASONS")
+    return out
+
+
+_SHORT_CIRCUIT_OVERRIDES = _short_circuit_env_overrides()
+
+
+def build(raw: Any, source: str = "defaults") -> ActiveConfig:
+    """Valida + compila. Caro: llamarlo fuera del event loop (`asyncio.to_thread`)."""
+    cfg = validate(raw)
+    cfg["short_circuit"] = {**cfg["short_circuit"], **_SHORT_CIRCUIT_OVERRIDES}
+    return ActiveConfig(
+        version=config_version(cfg),
+        source=source,
+        loaded_at=time.time(),
+        classifier=compile_config(
+            cfg["intents"],
+            cfg["scoring_rules"],
+            cfg["urgency_keywords"],
+            cfg["vague_keywords"],
+            cfg["stack_keywords"],
+        ),
+        short_circuit=ShortCircuitPolicy.from_config(
+            cfg["short_circuit"],
+            cfg["missing_questions_templates"],
+            cfg["short_circuit_summary"],
+        ),
+    )
+
+
+def load_file(path: str) -> ActiveConfig:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except ValueError as e:
+        raise ConfigError(f"{path}: JSON inválido ({e})") from e
+    return build(raw, source=path)
+
+
+_active: ActiveConfig = build(default_config())
+set_active_config(_active.classifier)
+
+
+def active() -> ActiveConfig:
+    """Snapshot de la config activa: usar el mismo objeto durante todo el request."""
+    return _active
+
+
+def activate(cfg: ActiveConfig) -> None:
+    global _active
+    _active = cfg
+    set_active_config(cfg.classifier)
+
+
+# =====================
+# Watcher (mtime polling, por worker)
+# =====================
+class ConfigWatcher:
+    def __init__(self, path: str, interval: float = 5.0, on_change=None):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change  # (old, new, error) -> None, para métricas/logs
+        self.last_error: Optional[str] = None
+        self._sig = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_now(self) -> ActiveConfig:
+        """Carga sincrónica (arranque). Si el archivo es inválido levanta: mejor no arrancar."""
+        self._sig = self._stat()
+        cfg = load_file(self.path)
+        activate(cfg)
+        return cfg
+
+    def ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    async def check(self) -> bool:
+        """Recarga si cambió el archivo. True si se activó una versión nueva."""
+        sig = self._stat()
+        if sig is None or sig == self._sig:
+            return False
+        self._sig = sig
+        old = active()
+        try:
+            new = await asyncio.to_thread(load_file, self.path)
+        except (ConfigError, OSError) as e:
+            self.last_error = str(e)
+            if self.on_change:
+                self.on_change(old, None, self.last_error)
+            return False
+        self.last_error = None
+        if new.version == old.version:
+            return False
+        activate(new)
+        if self.on_change:
+            self.on_change(old, new, None)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+
+def _main(argv: List[str]) -> int:
+    if argv[:1] == ["--dump"]:
+        print(json.dumps(default_config(), indent=2, ensure_ascii=False))
+        return 0
+    if len(argv) == 2 and argv[0] == "--check":
+        try:
+            cfg = load_file(argv[1])
+        except (ConfigError, OSError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        print(f"ok version={cfg.version}")
+        return 0
+    print(__doc__, file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main(sys.argv[1:]))
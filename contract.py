@@ -0,0 +1,242 @@
+# contract.py
+"""
+Decode de la respuesta de Xpander -> contract, en una sola pasada:
+
+    bytes del body --loads--> envelope --`result`--> JSON del agente --> contract normalizado
+
+Cada capa se parsea una sola vez. Si el JSON viene mezclado con texto
+(prosa del modelo, ```json fences, etc.) se recupera el primer objeto
+balanceado con un scanner que respeta strings, en vez de `find`/`rfind`.
+
+Usa `orjson` si está instalado (`pip install orjson`); si no, stdlib `json`.
+"""
+import json
+import re
+from typing import Any, Optional, Union
+
+from fastapi import HTTPException
+
+try:  # backend JSON rápido, opcional
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+CONTRACT_KEYS = ("summary", "assumptions", "missing_questions", "mvp_plan", "risks")
+_REQUIRED_KEYS = frozenset(CONTRACT_KEYS)
+
+# cantidad máxima de `{` candidatos que prueba el scanner (acota el peor caso)
+_MAX_SCAN_CANDIDATES = 16
+_BRACE_OR_QUOTE_RE = re.compile(r'[{}"]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+
+# =====================
+# Backend JSON
+# =====================
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto en UTF-8 (sin escapar no-ASCII)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# =====================
+# Scanner de objetos embebidos
+# =====================
+def _balanced_end(text: str, start: int) -> int:
+    """Índice después de la `}` que cierra la `{` en `start`, o -1 si no cierra."""
+    depth = 0
+    i = start
+    while True:
+        m = _BRACE_OR_QUOTE_RE.search(text, i)
+        if m is None:
+            return -1
+        c = m.group()
+        i = m.end()
+        if c == '"':
+            while True:
+                s = _STRING_END_RE.search(text, i)
+                if s is None:
+                    return -1
+                if s.group() == "\\":
+                    i = s.end() + 1
+                    continue
+                i = s.end()
+                break
+        elif c == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i
+
+
+def find_json_object(text: str) -> Optional[dict]:
+    """Primer objeto JSON balanceado y válido dentro de `text` (o None)."""
+    start = text.find("{")
+    tries = 0
+    while start != -1 and tries < _MAX_SCAN_CANDIDATES:
+        tries += 1
+        end = _balanced_end(text, start)
+        if end != -1:
+            try:
+                obj = loads(text[start:end])
+                if isinstance(obj, dict):
+                    return obj
+            except ValueError:
+                pass
+        start = text.find("{", start + 1)
+    return None
+
+
+def _as_text(data: Union[bytes, str]) -> str:
+    return data.decode("utf-8", errors="replace") if isinstance(data, (bytes, bytearray)) else data
+
+
+# =====================
+# Envelope -> contract
+# =====================
+def parse_json_or_error(body: Union[bytes, str]) -> dict:
+    if not body or not body.strip():
+        return {"error": "empty_response"}
+    try:
+        obj = loads(body)
+    except ValueError:
+        text = _as_text(body).strip()
+        obj = find_json_object(text)
+        if obj is None:
+            return {"error": "non_json_response", "raw": text[:2000]}
+    if isinstance(obj, dict):
+        return obj
+    return {"error": "non_object_json", "raw": obj}
+
+
+def extract_agent_result(envelope: dict) -> dict:
+    """
+    Xpander suele devolver un execution envelope con un campo `result`
+    que a veces viene como string JSON escapado.
+    Acá devolvemos SOLO el JSON final del agente (dict).
+    """
+    if not isinstance(envelope, dict):
+        raise HTTPException(status_code=502, detail={"error": "xpander_invalid_envelope"})
+
+    if "result" not in envelope:
+        # Algunos endpoints podrían devolver directamente el resultado; soportamos eso best-effort
+        if _REQUIRED_KEYS.issubset(envelope.keys()):
+            return envelope
+        raise HTTPException(status_code=502, detail={"error": "xpander_missing_result", "response": envelope})
+
+    raw = envelope.get("result")
+
+    # `result` puede venir como dict o como string JSON
+    if isinstance(raw, dict):
+        return raw
+
+    if isinstance(raw, str):
+        try:
+            obj = loads(raw)
+        except ValueError:
+            # el modelo a veces agrega texto o fences alrededor del JSON
+            obj = find_json_object(raw)
+            if obj is None:
+                raise HTTPException(
+                    status_code=502,
+                    detail={"error": "xpander_result_not_json", "raw": (raw or "")[:2000]},
+                )
+        if isinstance(obj, dict):
+            return obj
+        raise HTTPException(status_code=502, detail={"error": "xpander_result_not_object", "raw": obj})
+
+    raise HTTPException(status_code=502, detail={"error": "xpander_result_bad_type", "type": str(type(raw))})
+
+
+def normalize_contract(obj: dict) -> dict:
+    """
+    No estricto:
+    - Permite keys extra (las ignora).
+    - Si faltan keys, las completa con defaults.
+    - Si tipos vienen mal, intenta convertir; si no, default.
+    - Nunca levanta 502 por contrato.
+    """
+
+    if not isinstance(obj, dict):
+        return {
+            "summary": "",
+            "assumptions": [],
+            "missing_questions": [],
+            "mvp_plan": [],
+            "risks": [],
+        }
+
+    def _as_str(x):
+        return x.strip() if isinstance(x, str) else str(x) if x is not None else ""
+
+    def _as_list_str(x):
+        if isinstance(x, list):
+            return [s for s in (_as_str(i) for i in x) if s]
+        if isinstance(x, str) and x.strip():
+            return [x.strip()]
+        return []
+
+    def _as_mvp(x):
+        if not isinstance(x, list):
+            return []
+        out = []
+        for it in x:
+            if isinstance(it, dict):
+                step = _as_str(it.get("step"))
+                effort = _as_str(it.get("effort"))
+                if step:
+                    out.append({"step": step, "effort": effort or "?"})
+            elif isinstance(it, str) and it.strip():
+                out.append({"step": it.strip(), "effort": "?"})
+        return out
+
+    normalized = {
+        "summary": _as_str(obj.get("summary")),
+        "assumptions": _as_list_str(obj.get("assumptions")),
+        "missing_questions": _as_list_str(obj.get("missing_questions")),
+        "mvp_plan": _as_mvp(obj.get("mvp_plan")),
+        "risks": _as_list_str(obj.get("risks")),
+    }
+
+    # límites suaves (no estrictos)
+    if len(normalized["missing_questions"]) > 7:
+        normalized["missing_questions"] = normalized["missing_questions"][:7]
+
+    if len(normalized["mvp_plan"]) > 8:
+        normalized["mvp_plan"] = normalized["mvp_plan"][:8]
+
+    return normalized
+
+
+def decode_agent_result(status_code: int, body: Union[bytes, str]) -> dict:
+    """Status + body crudo de Xpander -> JSON del agente, sin normalizar (o HTTPException 502)."""
+    data = parse_json_or_error(body)
+
+    if status_code >= 400:
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "error": "xpander_bad_status",
+                "status_code": status_code,
+                "response": data,
+            },
+        )
+
+    # si el body no es json, también es 502
+    if data.get("error"):
+        raise HTTPException(status_code=502, detail={"error": "xpander_non_json", "response": data})
+
+    return extract_agent_result(data)
+
+
+def decode_response(status_code: int, body: Union[bytes, str]) -> dict:
+    """Status + body crudo de Xpander -> contract normalizado (o HTTPException 502)."""
+    return normalize_contract(decode_agent_result(status_code, body))
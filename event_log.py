@@ -0,0 +1,223 @@
+# event_log.py
+"""
+Log de eventos (clasificación + resultado) en JSONL, sin bloquear requests.
+
+- `emit()` solo encola (put_nowait). Si la cola está llena el evento se
+  descarta y se cuenta; el writer deja un evento `dropped` con el total.
+- Un task de fondo junta lotes (hasta `EVENT_LOG_BATCH` o `EVENT_LOG_FLUSH_SECONDS`)
+  y los escribe en un thread; nunca hay I/O de disco en el loop.
+- Rotación por tamaño (`EVENT_LOG_MAX_BYTES`) y por tiempo
+  (`EVENT_LOG_ROTATE_SECONDS`): `events.jsonl` -> `events.jsonl.1` -> ... hasta
+  `EVENT_LOG_BACKUPS`.
+
+`EVENT_LOG_PATH` vacío = desactivado. Con varios workers usar `{pid}` en el
+path (p.ej. `logs/events-{pid}.jsonl`) para que cada uno rote su archivo.
+"""
+import asyncio
+import atexit
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from contract import dumps
+
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "").strip()
+EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+EVENT_LOG_ROTATE_SECONDS = float(os.getenv("EVENT_LOG_ROTATE_SECONDS", "86400"))  # 0 = solo por tamaño
+EVENT_LOG_BACKUPS = int(os.getenv("EVENT_LOG_BACKUPS", "5"))
+EVENT_LOG_QUEUE = int(os.getenv("EVENT_LOG_QUEUE", "10000"))
+EVENT_LOG_BATCH = int(os.getenv("EVENT_LOG_BATCH", "500"))
+EVENT_LOG_FLUSH_SECONDS = float(os.getenv("EVENT_LOG_FLUSH_SECONDS", "1"))
+
+
+def message_hash(message: str) -> str:
+    """Hash del mensaje normalizado: permite agrupar repetidos sin loguear el texto."""
+    norm = " ".join((message or "").lower().split())
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()[:16]
+
+
+class EventLog:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_seconds: float = 86400.0,
+        backups: int = 5,
+        max_queue: int = 10000,
+        batch: int = 500,
+        flush_seconds: float = 1.0,
+        on_drop: Optional[Callable[[], None]] = None,
+    ):
+        self.path = path.replace("{pid}", str(os.getpid())) if path else ""
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = max(0, backups)
+        self.batch = max(1, batch)
+        self.flush_seconds = flush_seconds
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._reported_drops = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue))
+        self._task: Optional[asyncio.Task] = None
+        self._leftover: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()  # writer thread vs flush de shutdown
+        self._fh = None
+        self._opened_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        event.setdefault("ts", round(time.time(), 3))
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.on_drop:
+                self.on_drop()
+            return
+        self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sin loop (script/atexit): queda en la cola hasta flush_sync()
+        self._task = loop.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> None:
+        """Escribe lo que quede en la cola (shutdown / atexit)."""
+        batch, self._leftover = self._leftover, []
+        while batch or not self._queue.empty():
+            self._write(self._drain(batch))
+            batch = []
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def _drain(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        while len(batch) < self.batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        try:
+            while True:
+                batch = self._drain([await self._queue.get()])
+                if len(batch) < self.batch and self.flush_seconds > 0:
+                    await asyncio.sleep(self.flush_seconds)
+                    self._drain(batch)
+                pending, batch = batch, []
+                await asyncio.to_thread(self._write, pending)
+        except asyncio.CancelledError:
+            self._leftover = batch  # lo escribe flush_sync()
+            raise
+
+    # --- todo lo de abajo corre en un thread (o en shutdown) ---
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._write_locked(batch)
+
+    def _write_locked(self, batch: List[Dict[str, Any]]) -> None:
+        if self.dropped > self._reported_drops:
+            batch.append({"ts": round(time.time(), 3), "event": "dropped", "count": self.dropped - self._reported_drops})
+            self._reported_drops = self.dropped
+        if not batch:
+            return
+        data = b"".join(dumps(e) + b"\n" for e in batch)
+        try:
+            fh = self._open()
+            fh.write(data)
+            fh.flush()
+            if fh.tell() >= self.max_bytes or (
+                self.rotate_seconds > 0 and time.time() - self._opened_at >= self.rotate_seconds
+            ):
+                self._rotate()
+        except OSError as e:
+            # el log nunca tumba el servicio; se pierde el lote y se cuenta
+            self.dropped += len(batch)
+            print("[event_log] error escribiendo", self.path, "-", e)
+
+    def _open(self):
+        if self._fh is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._fh = open(self.path, "ab")
+            self._opened_at = time.time()
+        return self._fh
+
+    def _rotate(self) -> None:
+        self._fh.close()
+        self._fh = None
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+# =====================
+# Instancia por proceso + contexto del request
+# =====================
+_log = EventLog(
+    EVENT_LOG_PATH,
+    max_bytes=EVENT_LOG_MAX_BYTES,
+    rotate_seconds=EVENT_LOG_ROTATE_SECONDS,
+    backups=EVENT_LOG_BACKUPS,
+    max_queue=EVENT_LOG_QUEUE,
+    batch=EVENT_LOG_BATCH,
+    flush_seconds=EVENT_LOG_FLUSH_SECONDS,
+)
+atexit.register(_log.flush_sync)
+
+_notes: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("event_notes", default=None)
+
+
+def get() -> EventLog:
+    return _log
+
+
+def enabled() -> bool:
+    return _log.enabled
+
+
+def emit(event: Dict[str, Any]) -> None:
+    _log.emit(event)
+
+
+def start() -> Dict[str, Any]:
+    """Abre un dict de notas para el request/task actual (lo ven las tareas hijas)."""
+    notes: Dict[str, Any] = {}
+    _notes.set(notes)
+    return notes
+
+
+def note(**fields: Any) -> None:
+    """Agrega datos al evento en curso (p.ej. status de Xpander) si hay uno abierto."""
+    notes = _notes.get()
+    if notes is not None:
+        notes.update(fields)
@@ -1,7 +1,7 @@
 # intent_classifier.py
 import re
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
 
 from intent_config import (
     INTENTS,
@@ -24,6 +24,14 @@ SCOPE_PATTERNS = [
     ("automate", re.compile(r"\b(automatizar|automation|workflow)\b", re.IGNORECASE)),
 ]
 
+# Versión lineal de SCOPE_PATTERNS: un solo finditer por palabras completas.
+# `from_to` equivale a "desde|from" seguido (en la misma línea) por "a|to";
+# evita el `.+` con backtracking cuadrático del patrón original.
+_SCOPE_SCAN_RE = re.compile(
+    r"\b(?:(desde|from)|(a|to)|(integrar|integración|integration|sync)|(automatizar|automation|workflow))\b|\n",
+    re.IGNORECASE,
+)
+
 @dataclass
 class IntentResult:
     intent_id: str
@@ -36,63 +44,187 @@ def _norm(s: str) -> str:
     return (s or "").strip().lower()
 
 
-def _contains_any(text: str, keywords: List[str]) -> List[str]:
-    hits = []
-    for k in keywords:
-        if k and k.lower() in text:
-            hits.append(k)
-    return hits
+def _trie_pattern(words: Sequence[str]) -> str:
+    """
+    Arma un regex tipo trie (prefijos comunes factorizados) para las keywords.
+    El cuantificador `?` es greedy: en cada posición matchea la keyword más larga.
+    """
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _build(node: Dict) -> str:
+        terminal = "" in node
+        alts = [re.escape(ch) + _build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if terminal:
+            body = "(?:" + body + ")?"
+        return body
+
+    return _build(trie)
+
+
+class _KeywordMatcher:
+    """
+    Matcher multi-keyword de una sola pasada (substring, igual que `k in text`).
+    En cada posición el regex devuelve la keyword más larga; las más cortas que
+    empiezan ahí son necesariamente prefijos de esa, así que se resuelven con
+    una tabla precalculada (ej: "leads" -> {"lead", "leads"}).
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        kws = sorted({k.lower() for k in keywords if k})
+        self._prefixes: Dict[str, FrozenSet[str]] = {
+            k: frozenset(p for p in kws if k.startswith(p)) for k in kws
+        }
+        self._rx = re.compile(_trie_pattern(kws)) if kws else None
+
+    def find(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        if self._rx is None or not text:
+            return found
+        search = self._rx.search
+        prefixes = self._prefixes
+        m = search(text)
+        while m is not None:
+            found |= prefixes[m.group()]
+            m = search(text, m.start() + 1)  # +1 (no m.end()): permite matches solapados
+        return found
+
+
+# (keyword tal cual se reporta en reasons, keyword en minúscula para matchear)
+_Table = Tuple[Tuple[str, str], ...]
+
+# Palabras sin las cuales ningún SCOPE_PATTERN puede matchear ("a"/"to" solos no alcanzan)
+_SCOPE_TRIGGERS = ("desde", "from", "integrar", "integración", "integration", "sync",
+                   "automatizar", "automation", "workflow")
+
+
+def _table(keywords: Iterable[str]) -> _Table:
+    return tuple((k, k.lower()) for k in keywords if k)
+
+
+def _word_pattern(keywords: Iterable[str]) -> Optional["re.Pattern[str]"]:
+    kws = sorted(set(keywords), key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, kws)) + r")\b") if kws else None
+
+
+@dataclass(frozen=True)
+class CompiledConfig:
+    """Tablas de keywords ya compiladas. Inmutable: se reemplaza entera, nunca se edita."""
+
+    matcher: _KeywordMatcher
+    intents: Tuple[Tuple[str, str, _Table], ...]  # (id, label, keywords)
+    urgency: _Table
+    vague: _Table
+    vague_rx: Optional["re.Pattern[str]"]  # palabras completas: "ping" no matchea "shopping"
+    stack: _Table
+    scoring: Dict[str, int]
 
 
-def classify_intent_and_score(message: str) -> Dict:
-    text = _norm(message)
+def compile_config(intents, scoring_rules, urgency_keywords, vague_keywords, stack_keywords) -> CompiledConfig:
+    """Caro (arma el regex): hacerlo fuera del hot path y después `set_active_config()`."""
+    # las keywords de intents se reportan en minúscula (como siempre)
+    compiled_intents = tuple(
+        (it["id"], it["label"], _table(k.lower() for k in it.get("keywords", [])))
+        for it in intents
+    )
+    urgency, vague, stack = _table(urgency_keywords), _table(vague_keywords), _table(stack_keywords)
+    all_keywords = [kl for tbl in [t for _, _, t in compiled_intents] + [urgency, vague, stack] for _, kl in tbl]
+    return CompiledConfig(
+        matcher=_KeywordMatcher(all_keywords + list(_SCOPE_TRIGGERS)),
+        intents=compiled_intents,
+        urgency=urgency,
+        vague=vague,
+        vague_rx=_word_pattern(kl for _, kl in vague),
+        stack=stack,
+        scoring=scoring_rules,
+    )
+
+
+_COMPILED = compile_config(INTENTS, SCORING_RULES, URGENCY_KEYWORDS, VAGUE_KEYWORDS, STACK_KEYWORDS)
+
+
+def _hits(table: _Table, found: Set[str]) -> List[str]:
+    # mismo orden (y duplicados) que la lista original
+    return [k for k, kl in table if kl in found]
+
+
+def _scope_hit(text: str) -> str:
+    opened = False
+    flags = {"from_to": False, "integrate": False, "automate": False}
+    for m in _SCOPE_SCAN_RE.finditer(text):
+        if m.group(1):
+            opened = True
+        elif m.group(2):
+            if opened:
+                flags["from_to"] = True
+                break  # from_to tiene prioridad, no hace falta seguir
+        elif m.group(3):
+            flags["integrate"] = True
+        elif m.group(4):
+            flags["automate"] = True
+        else:  # "\n": `.` no cruza líneas
+            opened = False
+    for name, _ in SCOPE_PATTERNS:
+        if flags.get(name):
+            return name
+    return ""
+
+
+def _classify(text: str, cfg: CompiledConfig) -> Dict:
+    found = cfg.matcher.find(text)
 
     # -------- Intent (keyword overlap) --------
     best = ("other", "Otro / No clasificado", 0, [])
-    for intent in INTENTS:
-        kws = [k.lower() for k in intent.get("keywords", [])]
-        hits = _contains_any(text, kws)
+    for intent_id, intent_label, kws in cfg.intents:
+        hits = _hits(kws, found)
         if len(hits) > best[2]:
-            best = (intent["id"], intent["label"], len(hits), hits)
+            best = (intent_id, intent_label, len(hits), hits)
 
     intent_id, intent_label, _, intent_hits = best
 
     # -------- Score (0..100) --------
     score = 0
     reasons: List[str] = []
+    rules = cfg.scoring
 
     # Vague penalty first (pero no bloquea)
-    vague_hits = _contains_any(text, VAGUE_KEYWORDS)
+    # el matcher es por substring: se confirma por palabra completa solo si hubo algún candidato
+    vague_hits = _hits(cfg.vague, found)
+    if vague_hits:
+        vague_hits = _hits(cfg.vague, set(cfg.vague_rx.findall(text)))
     if vague_hits:
-        score += SCORING_RULES["is_vague_penalty"]
+        score += rules["is_vague_penalty"]
         reasons.append(f"vague_penalty({', '.join(vague_hits)})")
 
     # Budget
     if BUDGET_RE.search(text):
-        score += SCORING_RULES["has_budget"]
+        score += rules["has_budget"]
         reasons.append("has_budget")
 
     # Urgency
-    urg_hits = _contains_any(text, URGENCY_KEYWORDS)
+    urg_hits = _hits(cfg.urgency, found)
     if urg_hits:
-        score += SCORING_RULES["has_urgency"]
+        score += rules["has_urgency"]
         reasons.append(f"has_urgency({', '.join(urg_hits)})")
 
     # Stack
-    stack_hits = _contains_any(text, STACK_KEYWORDS)
+    stack_hits = _hits(cfg.stack, found)
     if stack_hits:
-        score += SCORING_RULES["has_stack"]
+        score += rules["has_stack"]
         reasons.append(f"has_stack({', '.join(sorted(set(stack_hits)))})")
 
     # Scope
-    scope_hit = False
-    for name, rx in SCOPE_PATTERNS:
-        if rx.search(text):
-            scope_hit = True
-            reasons.append(f"has_scope({name})")
-            break
-    if scope_hit:
-        score += SCORING_RULES["has_scope"]
+    scope = _scope_hit(text) if not found.isdisjoint(_SCOPE_TRIGGERS) else ""
+    if scope:
+        reasons.append(f"has_scope({scope})")
+        score += rules["has_scope"]
 
     # Intent signal boosts a little (si no es other)
     if intent_id != "other" and intent_hits:
@@ -107,4 +239,24 @@ def classify_intent_and_score(message: str) -> Dict:
         "intent": {"id": intent_id, "label": intent_label},
         "score": score,
         "reasons": reasons,
-    }
\ No newline at end of file
+    }
+
+
+def active_config() -> CompiledConfig:
+    return _COMPILED
+
+
+def set_active_config(cfg: CompiledConfig) -> None:
+    # swap atómico de la referencia: cada llamada ve la config vieja o la nueva, nunca una mezcla
+    global _COMPILED
+    _COMPILED = cfg
+
+
+def classify_intent_and_score(message: str, config: Optional[CompiledConfig] = None) -> Dict:
+    return _classify(_norm(message), config or _COMPILED)
+
+
+def classify_many(messages: Iterable[str], config: Optional[CompiledConfig] = None) -> List[Dict]:
+    """Clasifica varios mensajes con la misma config compilada."""
+    cfg = config or _COMPILED
+    return [_classify(_norm(m), cfg) for m in messages]
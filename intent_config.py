@@ -38,4 +38,49 @@ SCORING_RULES = {
 }
 
 URGENCY_KEYWORDS = ["urgente", "alta", "asap", "ya", "hoy", "mañana", "prioridad"]
-VAGUE_KEYWORDS = ["ping", "test", "hola", "prueba"]
\ No newline at end of file
+VAGUE_KEYWORDS = ["ping", "test", "hola", "prueba"]
+
+# Short-circuit: mensajes que no justifican una llamada al LLM ("hola", "test", "ping"...).
+# Se responde al toque con un contract precalculado (mayormente preguntas).
+# Tienen que cumplirse TODAS las condiciones configuradas (lista vacía = no filtra).
+SHORT_CIRCUIT_POLICY = {
+    "enabled": True,
+    "max_score": 0,                 # score <= max_score
+    "intents": ["other"],           # intent.id dentro de esta lista (un intent detectado va al agente)
+    "reasons": ["vague_penalty"],   # hay reasons y TODAS empiezan con alguno de estos prefijos
+}
+
+SHORT_CIRCUIT_SUMMARY = "El mensaje no tiene detalle suficiente para armar una propuesta."
+
+# Preguntas por intent para el contract de short-circuit ("other" es el fallback)
+MISSING_QUESTIONS_TEMPLATES = {
+    "lead_automation": [
+        "¿De dónde vienen los leads hoy (formulario, ads, CRM)?",
+        "¿A qué herramienta tienen que llegar (HubSpot, Pipedrive, Airtable, Slack)?",
+        "¿Qué volumen de leads manejan por mes?",
+        "¿Para cuándo lo necesitás y con qué presupuesto?",
+    ],
+    "customer_support_ai": [
+        "¿Qué herramienta de soporte usan (Zendesk, Intercom, otra)?",
+        "¿Cuántos tickets o consultas reciben por mes?",
+        "¿Tienen una base de conocimiento o FAQ documentada?",
+        "¿Para cuándo lo necesitás y con qué presupuesto?",
+    ],
+    "data_pipelines": [
+        "¿Cuáles son las fuentes y el destino de los datos?",
+        "¿Con qué frecuencia se tienen que sincronizar?",
+        "¿Qué volumen de datos manejan?",
+        "¿Para cuándo lo necesitás y con qué presupuesto?",
+    ],
+    "growth_marketing_automation": [
+        "¿Qué canales y herramientas de marketing usan hoy?",
+        "¿Qué proceso querés automatizar (segmentación, campañas, atribución)?",
+        "¿Qué métricas querés mejorar?",
+        "¿Para cuándo lo necesitás y con qué presupuesto?",
+    ],
+    "other": [
+        "¿Qué proceso o problema querés automatizar?",
+        "¿Qué herramientas usan hoy (CRM, planillas, Slack, etc.)?",
+        "¿Para cuándo lo necesitás y con qué presupuesto?",
+    ],
+}
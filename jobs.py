@@ -0,0 +1,318 @@
+# jobs.py
+"""
+Modo asíncrono: los requests encolan un job y vuelven al toque; un pool de
+workers drena la cola contra Xpander.
+
+Los jobs viven en un SQLite compartido (`JOBS_STORE_PATH`), así que con
+varios workers de uvicorn cualquiera puede tomar un job y cualquiera responde
+`GET /jobs/{id}`. Cada job se "alquila" (lease) al tomarlo: si el worker muere
+a mitad de camino, otro lo retoma al vencer el lease; si el proceso se apaga
+en orden (`stop()`), los jobs en curso vuelven a la cola al toque.
+
+La cola es acotada (entre todos los workers): si está llena, `submit()`
+levanta `JobQueueFull` y la API responde 429 en vez de acumular trabajo.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from contract import dumps
+from sqlite_store import SqliteStore
+
+
+class JobQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("job queue full")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    id: str
+    message: str
+    intent: dict
+    callback_url: Optional[str] = None
+    status: str = "queued"  # queued | running | done | error
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[dict] = None
+    callback_status: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def to_dict(self) -> dict:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            **self.intent,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            out["result"] = self.result
+        if self.error is not None:
+            out["error"] = self.error
+        if self.callback_url:
+            out["callback_status"] = self.callback_status
+        return out
+
+
+_COLUMNS = (
+    "id, status, message, intent, callback_url, created_at, started_at, finished_at,"
+    " result, error, callback_status"
+)
+
+
+def _job_from_row(row) -> Job:
+    (job_id, status, message, intent, callback_url, created_at, started_at, finished_at,
+     result, error, callback_status) = row
+    return Job(
+        id=job_id,
+        message=message,
+        intent=json.loads(intent),
+        callback_url=callback_url,
+        status=status,
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+        result=json.loads(result) if result is not None else None,
+        error=json.loads(error) if error is not None else None,
+        callback_status=callback_status,
+    )
+
+
+class JobStore(SqliteStore):
+    """Tabla de jobs en SQLite (WAL), compartida entre procesos."""
+
+    def __init__(self, path: str):
+        super().__init__(path, [
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, message TEXT NOT NULL, intent TEXT NOT NULL,"
+            " callback_url TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+            " result BLOB, error TEXT, callback_status TEXT,"
+            " lease_until REAL NOT NULL DEFAULT 0, owner TEXT)",
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)",
+        ])
+
+    def insert(self, job: Job, max_pending: int) -> Optional[int]:
+        """Guarda el job si hay lugar; si no, devuelve cuántos hay pendientes."""
+        def run(db):
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= max_pending:
+                return pending
+            db.execute(
+                "INSERT INTO jobs (id, status, message, intent, callback_url, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.message, dumps(job.intent).decode("utf-8"), job.callback_url, job.created_at),
+            )
+            return None
+        return self._tx(run)
+
+    def claim(self, owner: str, lease: float) -> Optional[Job]:
+        """Toma el job en cola más viejo (o uno `running` con el lease vencido) y lo alquila."""
+        def run(db):
+            now = time.time()
+            row = db.execute(
+                f"SELECT {_COLUMNS} FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND lease_until <= ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = _job_from_row(row)
+            job.status, job.started_at = "running", now
+            db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, lease_until = ?, owner = ? WHERE id = ?",
+                (now, now + lease, owner, job.id),
+            )
+            return job
+        return self._tx(run)
+
+    def finish(self, job: Job) -> None:
+        self._tx(lambda db: db.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, lease_until = 0, owner = NULL"
+            " WHERE id = ?",
+            (
+                job.status,
+                job.finished_at,
+                dumps(job.result) if job.result is not None else None,
+                dumps(job.error).decode("utf-8") if job.error is not None else None,
+                job.id,
+            ),
+        ))
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Devuelve el job a la cola (shutdown a mitad de camino): otro worker lo retoma ya."""
+        self._tx(lambda db: db.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, lease_until = 0, owner = NULL"
+            " WHERE id = ? AND owner = ? AND status = 'running'",
+            (job_id, owner),
+        ))
+
+    def set_callback_status(self, job_id: str, status: str) -> None:
+        self._tx(lambda db: db.execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (status, job_id)))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._read(lambda db: db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        return _job_from_row(row) if row is not None else None
+
+    def depth(self) -> int:
+        return self._read(lambda db: db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0])
+
+    def purge(self, cutoff: float) -> int:
+        return self._tx(lambda db: db.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?", (cutoff,)
+        ).rowcount)
+
+
+class JobManager:
+    """
+    `run(job)` hace el trabajo y devuelve el contract (o levanta); `on_finished(job)`
+    se llama al terminar (ej. para el callback). Los jobs terminados se guardan
+    `ttl` segundos para que el cliente los pueda leer.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Job], Awaitable[dict]],
+        store_path: str = "jobs.db",
+        workers: int = 4,
+        max_queue: int = 100,
+        ttl: float = 600.0,
+        poll_seconds: float = 0.5,
+        lease_seconds: float = 300.0,
+        on_finished: Optional[Callable[[Job], Awaitable[None]]] = None,
+        describe_error: Optional[Callable[[BaseException], dict]] = None,
+    ):
+        self._run = run
+        self._on_finished = on_finished
+        self._describe_error = describe_error or (lambda e: {"error": type(e).__name__})
+        self.store_path = store_path
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.ttl = ttl
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._store: Optional[JobStore] = None
+        self._tasks: list = []
+        self._wakeup = asyncio.Event()  # hay algo nuevo en la cola (de este proceso)
+        self._finished: Dict[str, list] = {}  # job_id -> [Event, long-polls esperando en este proceso]
+        self._avg_seconds = 5.0  # EWMA de duración por job (para Retry-After)
+        self._last_purge = 0.0
+
+    # -- lifecycle ------------------------------------------------------
+    async def start(self) -> None:
+        self._store = await asyncio.to_thread(JobStore, self.store_path)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store is not None:
+            await asyncio.to_thread(self._store.close)
+            self._store = None
+
+    # -- API ------------------------------------------------------------
+    def retry_after(self, depth: int) -> int:
+        # tiempo estimado hasta que se libere un lugar en la cola
+        return max(1, int(self._avg_seconds * max(1, depth) / self.workers))
+
+    async def submit(self, message: str, intent: dict, callback_url: Optional[str] = None) -> Job:
+        if self._store is None:
+            raise RuntimeError("JobManager not started")
+        await self._purge()
+        job = Job(id=uuid.uuid4().hex, message=message, intent=intent, callback_url=callback_url)
+        pending = await asyncio.to_thread(self._store.insert, job, self.max_queue)
+        if pending is not None:
+            raise JobQueueFull(self.retry_after(pending))
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        if self._store is None:
+            raise RuntimeError("JobManager not started")
+        return await asyncio.to_thread(self._store.get, job_id)
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """Long-poll: espera hasta que el job termine o pase `timeout`."""
+        if timeout <= 0 or job.finished:
+            return job
+        deadline = time.monotonic() + timeout
+        entry = self._finished.setdefault(job.id, [asyncio.Event(), 0])
+        entry[1] += 1
+        try:
+            while not job.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # si lo termina este proceso avisa al toque; si lo corre otro worker, se relee cada poll
+                try:
+                    await asyncio.wait_for(entry[0].wait(), min(remaining, self.poll_seconds))
+                except asyncio.TimeoutError:
+                    pass
+                job = await self.get(job.id) or job
+        finally:
+            entry[1] -= 1
+            if not entry[1] and self._finished.get(job.id) is entry:
+                del self._finished[job.id]
+        return job
+
+    # -- internals ------------------------------------------------------
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self._store.claim, self._owner, self.lease_seconds)
+            if job is None:
+                # nada para hacer: espera un submit de este proceso o el próximo poll (los de otros workers)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Job) -> None:
+        try:
+            job.result = await self._run(job)
+            job.status = "done"
+        except asyncio.CancelledError:
+            # shutdown / restart: no es un error del job, vuelve a la cola para este u otro proceso
+            self._store.release(job.id, self._owner)  # sin thread, que no lo corte otra cancelación
+            raise
+        except Exception as e:
+            job.status, job.error = "error", self._describe_error(e)
+        await asyncio.to_thread(self._finish, job)
+        entry = self._finished.get(job.id)
+        if entry is not None:
+            entry[0].set()
+        if self._on_finished is not None:
+            try:
+                await self._on_finished(job)
+            except Exception as e:
+                job.callback_status = f"error:{type(e).__name__}"
+            if job.callback_status is not None:
+                await asyncio.to_thread(self._store.set_callback_status, job.id, job.callback_status)
+
+    def _finish(self, job: Job) -> None:
+        job.finished_at = time.time()
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (job.finished_at - (job.started_at or job.finished_at))
+        self._store.finish(job)
+
+    async def _purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 1.0:
+            return
+        self._last_purge = now
+        await asyncio.to_thread(self._store.purge, now - self.ttl)
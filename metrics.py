@@ -0,0 +1,254 @@
+# metrics.py
+"""
+Métricas Prometheus + timing por etapa (header `Server-Timing`).
+
+Multi-worker: si `PROMETHEUS_MULTIPROC_DIR` está seteado (ver Dockerfile),
+cada worker de uvicorn escribe sus métricas en ese directorio y `/metrics`
+agrega las de todos, sin importar qué worker atiende el scrape.
+"""
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+_REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90)
+_STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                  0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+_SCORE_BUCKETS = (0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100)
+
+REQUEST_LATENCY = Histogram(
+    "intake_request_duration_seconds", "Latencia total por request HTTP",
+    ["route", "method", "status"], buckets=_REQUEST_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "intake_stage_duration_seconds",
+    "Latencia por etapa (classify, connect, upstream_ttfb, upstream, decode, normalize, serialize)",
+    ["stage"], buckets=_STAGE_BUCKETS,
+)
+READY = Gauge("intake_ready_workers", "Workers que terminaron el warm-up", multiprocess_mode="livesum")
+INFLIGHT = Gauge("intake_inflight_requests", "Requests HTTP en curso", multiprocess_mode="livesum")
+UPSTREAM_INFLIGHT = Gauge("intake_upstream_inflight", "Llamadas a Xpander en curso", multiprocess_mode="livesum")
+UPSTREAM_RESULTS = Counter(
+    "intake_upstream_results_total",
+    "Resultado de llamadas a Xpander por ruta (ok | xpander_timeout | xpander_non_json | ...)", ["route", "outcome"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "intake_upstream_duration_seconds", "Latencia de llamadas a Xpander por ruta (incluye hedges y errores)",
+    ["route"], buckets=_REQUEST_BUCKETS,
+)
+UPSTREAM_STATUS = Counter("intake_upstream_status_total", "HTTP status devuelto por Xpander", ["code"])
+BREAKER_STATE = Gauge(
+    "intake_upstream_breaker_state", "Circuit breaker por ruta (0=closed, 1=half_open, 2=open; peor worker)",
+    ["route"], multiprocess_mode="livemax",
+)
+BREAKER_TRANSITIONS = Counter(
+    "intake_upstream_breaker_transitions_total", "Cambios de estado del breaker", ["route", "state"],
+)
+UPSTREAM_TIMEOUT = Gauge(
+    "intake_upstream_timeout_seconds", "Timeout adaptativo actual por ruta (peor worker)",
+    ["route"], multiprocess_mode="livemax",
+)
+ADMISSION_QUEUE = Gauge(
+    "intake_admission_queue_depth", "Requests esperando slot hacia Xpander", ["route"], multiprocess_mode="livesum",
+)
+ADMISSION_SLOTS_IN_USE = Gauge(
+    "intake_admission_slots_in_use", "Slots de admisión ocupados", ["route"], multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "intake_admission_wait_seconds", "Espera en la cola de admisión (admitted | queue_timeout | shed | ...)",
+    ["route", "outcome"], buckets=_REQUEST_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "intake_admission_rejected_total", "Requests descartados antes de Xpander (rate_limited | queue_full | queue_timeout | shed)",
+    ["route", "reason"],
+)
+WEBHOOK_DELIVERIES = Counter(
+    "intake_webhook_deliveries_total", "Items entregados a webhooks (ok | retry | dead)", ["sink", "outcome"],
+)
+WEBHOOK_LATENCY = Histogram(
+    "intake_webhook_duration_seconds", "Duración de cada POST a un webhook", ["sink"], buckets=_REQUEST_BUCKETS,
+)
+WEBHOOK_SPOOL = Gauge(
+    "intake_webhook_spool_pending", "Items pendientes en el spool de webhooks (compartido)", multiprocess_mode="livemax",
+)
+WEBHOOK_DROPPED = Counter("intake_webhook_dropped_total", "Items de webhook descartados (buffer o spool llenos)")
+EVENT_LOG_DROPPED = Counter("intake_event_log_dropped_total", "Eventos descartados por cola del event log llena")
+HEDGES = Counter("intake_upstream_hedges_total", "Requests hedged a Xpander (sent | won | skipped)", ["outcome"])
+CACHE_RESULTS = Counter("intake_cache_total", "Resultado de cache por request", ["status"])
+SIMILARITY = Histogram(
+    "intake_similarity", "Similitud con el mensaje indexado más parecido (para calibrar SIMILARITY_THRESHOLD)",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0),
+)
+CONFIG_VERSION = Gauge(
+    "intake_config_version_info", "Versión de config de intents activa (suma = workers en esa versión)",
+    ["version"], multiprocess_mode="livesum",
+)
+CONFIG_RELOADS = Counter("intake_config_reloads_total", "Recargas de config de intents", ["result"])
+SHORT_CIRCUITS = Counter("intake_short_circuit_total", "Requests respondidos sin llamar al LLM", ["intent"])
+INTENTS = Counter("intake_intent_total", "Mensajes clasificados por intent", ["intent"])
+SCORES = Histogram("intake_intent_score", "Distribución del score por intent", ["intent"], buckets=_SCORE_BUCKETS)
+
+
+# =====================
+# Timing por etapa
+# =====================
+class StageTimer:
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        # una entrada por etapa (sumada): un batch de 500 items no puede armar un header de 50 KB
+        summed: Dict[str, float] = {}
+        for name, secs in self.stages:
+            summed[name] = summed.get(name, 0.0) + secs
+        parts = [f"{name};dur={secs * 1000:.2f}" for name, secs in summed.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current_timer: contextvars.ContextVar[Optional[StageTimer]] = contextvars.ContextVar("stage_timer", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_LATENCY.labels(name).observe(seconds)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.stages.append((name, seconds))
+
+
+def current_stages() -> Dict[str, float]:
+    """Etapas registradas hasta ahora en el request actual, en ms (para el event log)."""
+    timer = _current_timer.get()
+    out: Dict[str, float] = {}
+    if timer is not None:
+        for name, secs in timer.stages:
+            out[name] = round(out.get(name, 0.0) + secs * 1000, 2)
+    return out
+
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+class UpstreamTrace:
+    """
+    Callback de `extensions={"trace": ...}` de httpx: separa conexión (TCP+TLS,
+    0 si se reusó del pool) y time-to-first-byte de Xpander.
+    """
+
+    __slots__ = ("marks",)
+
+    def __init__(self):
+        self.marks = {}
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        self.marks[event_name] = time.perf_counter()
+
+    def _span(self, start: str, end: str) -> float:
+        m = self.marks
+        return m[end] - m[start] if start in m and end in m else 0.0
+
+    def record(self) -> None:
+        connect = self._span("connection.connect_tcp.started", "connection.connect_tcp.complete")
+        connect += self._span("connection.start_tls.started", "connection.start_tls.complete")
+        if connect:
+            record_stage("connect", connect)
+        for proto in ("http11", "http2"):
+            ttfb = self._span(f"{proto}.send_request_headers.started", f"{proto}.receive_response_headers.complete")
+            if ttfb:
+                record_stage("upstream_ttfb", ttfb)
+                break
+
+
+_BREAKER_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def set_breaker_state(route: str, old: str, new: str) -> None:
+    BREAKER_STATE.labels(route).set(_BREAKER_VALUES.get(new, 0))
+    BREAKER_TRANSITIONS.labels(route, new).inc()
+
+
+def set_config_version(version: str, previous: Optional[str] = None) -> None:
+    if previous:
+        CONFIG_VERSION.labels(previous).set(0)
+    CONFIG_VERSION.labels(version).set(1)
+
+
+def observe_intent(intent_id: str, score: int) -> None:
+    INTENTS.labels(intent_id or "unknown").inc()
+    SCORES.labels(intent_id or "unknown").observe(score)
+
+
+# =====================
+# ASGI middleware + exposición
+# =====================
+class MetricsMiddleware:
+    """Latencia total, in-flight y header `Server-Timing` en todas las respuestas HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        token = _current_timer.set(timer)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                value = timer.server_timing(total=time.perf_counter() - t0)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        INFLIGHT.inc()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            INFLIGHT.dec()
+            _current_timer.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(route, scope.get("method", ""), str(status)).observe(time.perf_counter() - t0)
+
+
+def render() -> Tuple[bytes, str]:
+    """Body + content-type para `/metrics` (agregando todos los workers si hay multiproceso)."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    # limpia los gauges `livesum` de este worker al apagarse
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,291 @@
+# rescore.py
+"""
+Re-scoring offline de exports JSONL (tipo `requests.jsonl`) con la config de
+intents actual, usando todos los cores.
+
+    python -m rescore export.jsonl -o scored.jsonl --report report.json
+    python -m rescore export.jsonl -o scored.csv --format csv --config intents.json --previous intents_old.json
+    zcat export.jsonl.gz | python -m rescore - -o - > scored.jsonl
+
+- Lee por bloques de bytes (nunca el archivo entero) y reparte los bloques a
+  un pool de procesos; cada worker parsea, clasifica y serializa su bloque.
+- La salida sale en el mismo orden que la entrada.
+- Texto de cada línea: `message`, o `title` + `body` (igual que bench/corpus.py).
+- `--previous`: clasifica también con otra config y el reporte trae el diff
+  (intents que cambiaron, transiciones, score antes/después).
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import config_store
+from contract import dumps, loads
+from event_log import message_hash
+from intent_classifier import classify_intent_and_score
+
+CSV_COLUMNS = [
+    "line", "id", "msg_hash", "intent_id", "intent_label", "score", "reasons",
+    "prev_intent_id", "prev_score", "config_version",
+]
+
+# config(s) compiladas, una vez por worker (ver _init_worker)
+_current: Optional[config_store.ActiveConfig] = None
+_previous: Optional[config_store.ActiveConfig] = None
+
+
+def _load(path: Optional[str]) -> config_store.ActiveConfig:
+    if not path or path == "defaults":
+        return config_store.build(config_store.default_config())
+    return config_store.load_file(path)
+
+
+def _init_worker(config_path: Optional[str], previous_path: Optional[str]) -> None:
+    global _current, _previous
+    _current = _load(config_path)
+    _previous = _load(previous_path) if previous_path else None
+
+
+def _text_of(obj: Any) -> Optional[str]:
+    if not isinstance(obj, dict):
+        return None
+    if isinstance(obj.get("message"), str):
+        return obj["message"]
+    text = " ".join(obj[k] for k in ("title", "body") if isinstance(obj.get(k), str))
+    return text or None
+
+
+def _id_of(obj: Dict[str, Any]) -> Any:
+    # `is not None`: un id 0 / "" / False es un id válido, no "falta"
+    for key in ("request_id", "id"):
+        if obj.get(key) is not None:
+            return obj[key]
+    return ""
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        "lines": 0,
+        "scored": 0,
+        "skipped": 0,
+        "intents": Counter(),
+        "score_hist": Counter(),
+        "score_sum": 0,
+        "prev_intents": Counter(),
+        "prev_score_sum": 0,
+        "changed": 0,
+        "transitions": Counter(),
+    }
+
+
+def _merge(into: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for k, v in part.items():
+        if isinstance(v, Counter):
+            into[k].update(v)
+        else:
+            into[k] += v
+
+
+def _score_block(block: bytes, first_line: int, fmt: str) -> Tuple[bytes, Dict[str, Any]]:
+    """Corre en el worker: bloque de líneas completas -> (salida serializada, stats parciales)."""
+    stats = _new_stats()
+    version = _current.version
+    out = io.StringIO() if fmt == "csv" else None
+    writer = csv.writer(out) if out is not None else None
+    chunks: List[bytes] = []
+
+    for offset, raw in enumerate(block.splitlines()):
+        if not raw.strip():
+            continue
+        stats["lines"] += 1
+        try:
+            obj = loads(raw)
+        except ValueError:
+            obj = None
+        text = _text_of(obj)
+        if text is None:
+            stats["skipped"] += 1
+            continue
+
+        pack = classify_intent_and_score(text, _current.classifier)
+        intent_id, score = pack["intent"]["id"], pack["score"]
+        stats["scored"] += 1
+        stats["intents"][intent_id] += 1
+        stats["score_hist"][min(score // 10 * 10, 90)] += 1
+        stats["score_sum"] += score
+
+        prev = None
+        if _previous is not None:
+            prev = classify_intent_and_score(text, _previous.classifier)
+            prev_id = prev["intent"]["id"]
+            stats["prev_intents"][prev_id] += 1
+            stats["prev_score_sum"] += prev["score"]
+            if prev_id != intent_id:
+                stats["changed"] += 1
+                stats["transitions"][f"{prev_id}->{intent_id}"] += 1
+
+        if writer is not None:
+            writer.writerow([
+                first_line + offset,
+                _id_of(obj),
+                message_hash(text),
+                intent_id,
+                pack["intent"]["label"],
+                score,
+                "|".join(pack["reasons"]),
+                prev["intent"]["id"] if prev else "",
+                prev["score"] if prev else "",
+                version,
+            ])
+        else:
+            enriched = {**obj, **pack, "config_version": version}
+            if prev is not None:
+                enriched["previous"] = {**prev, "config_version": _previous.version}
+            chunks.append(dumps(enriched))
+            chunks.append(b"\n")
+
+    data = out.getvalue().encode("utf-8") if out is not None else b"".join(chunks)
+    return data, stats
+
+
+def _read_blocks(fh, block_bytes: int) -> Iterator[Tuple[bytes, int]]:
+    """Bloques de ~block_bytes cortados en fin de línea, con el nro de la 1ra línea (1-based)."""
+    carry = b""
+    line_no = 1
+    while True:
+        chunk = fh.read(block_bytes)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            carry = chunk
+            continue
+        block, carry = chunk[:cut + 1], chunk[cut + 1:]
+        yield block, line_no
+        line_no += block.count(b"\n")
+    if carry:
+        yield carry, line_no
+
+
+def _report(stats: Dict[str, Any], current: str, previous: Optional[str], elapsed: float, workers: int) -> Dict[str, Any]:
+    scored = stats["scored"] or 1
+    report: Dict[str, Any] = {
+        "config_version": current,
+        "lines": stats["lines"],
+        "scored": stats["scored"],
+        "skipped": stats["skipped"],
+        "elapsed_seconds": round(elapsed, 3),
+        "lines_per_second": round(stats["lines"] / elapsed, 1) if elapsed > 0 else None,
+        "workers": workers,
+        "intents": dict(stats["intents"].most_common()),
+        "score_histogram": {f"{b}-{b + 9 if b < 90 else 100}": stats["score_hist"][b] for b in range(0, 100, 10)},
+        "score_mean": round(stats["score_sum"] / scored, 2),
+    }
+    if previous is not None:
+        report["diff"] = {
+            "previous_config_version": previous,
+            "changed_intent": stats["changed"],
+            "changed_ratio": round(stats["changed"] / scored, 4),
+            "previous_intents": dict(stats["prev_intents"].most_common()),
+            "intent_delta": {
+                k: stats["intents"][k] - stats["prev_intents"][k]
+                for k in sorted(set(stats["intents"]) | set(stats["prev_intents"]))
+            },
+            "previous_score_mean": round(stats["prev_score_sum"] / scored, 2),
+            "transitions": dict(stats["transitions"].most_common(50)),
+        }
+    return report
+
+
+def run(
+    src,
+    dst,
+    fmt: str = "jsonl",
+    config_path: Optional[str] = None,
+    previous_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    block_bytes: int = 1 << 20,
+) -> Dict[str, Any]:
+    """`src`/`dst` son archivos binarios ya abiertos. Devuelve el reporte."""
+    workers = workers or os.cpu_count() or 1
+    # valida las configs acá (y da la versión) antes de levantar el pool
+    current = _load(config_path)
+    previous = _load(previous_path) if previous_path else None
+
+    stats = _new_stats()
+    t0 = time.perf_counter()
+    if fmt == "csv":
+        dst.write((",".join(CSV_COLUMNS) + "\r\n").encode("utf-8"))
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(config_path, previous_path)) as pool:
+        # ventana acotada de bloques en vuelo: memoria constante y salida en orden
+        pending: deque = deque()
+        for block, first_line in _read_blocks(src, block_bytes):
+            pending.append(pool.submit(_score_block, block, first_line, fmt))
+            if len(pending) >= workers * 2:
+                data, part = pending.popleft().result()
+                dst.write(data)
+                _merge(stats, part)
+        while pending:
+            data, part = pending.popleft().result()
+            dst.write(data)
+            _merge(stats, part)
+    dst.flush()
+
+    return _report(
+        stats, current.version, previous.version if previous else None,
+        time.perf_counter() - t0, workers,
+    )
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        return (sys.stdin if "r" in mode else sys.stdout).buffer
+    return open(path, mode)
+
+
+def _main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(prog="python -m rescore", description="Re-scoring offline de JSONL con la config de intents.")
+    ap.add_argument("input", help="JSONL de entrada ('-' = stdin)")
+    ap.add_argument("-o", "--output", default="-", help="salida ('-' = stdout)")
+    ap.add_argument("--format", choices=("jsonl", "csv"), default=None, help="default: según extensión de --output, si no jsonl")
+    ap.add_argument("--config", default=config_store.INTENT_CONFIG_PATH or None,
+                    help="config de intents (JSON); default INTENT_CONFIG_PATH o defaults de intent_config.py")
+    ap.add_argument("--previous", default=None, help="config anterior para el diff ('defaults' = intent_config.py)")
+    ap.add_argument("--report", default=None, help="dónde escribir el reporte JSON (default: stderr)")
+    ap.add_argument("--workers", type=int, default=None, help="procesos (default: cantidad de cores)")
+    ap.add_argument("--block-kb", type=int, default=1024, help="tamaño de bloque por tarea")
+    args = ap.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    try:
+        src = _open(args.input, "rb")
+        dst = _open(args.output, "wb")
+        try:
+            report = run(src, dst, fmt, args.config, args.previous, args.workers, args.block_kb * 1024)
+        finally:
+            if src is not sys.stdin.buffer:
+                src.close()
+            if dst is not sys.stdout.buffer:
+                dst.close()
+    except (config_store.ConfigError, OSError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    body = dumps(report)
+    if args.report:
+        with open(args.report, "wb") as fh:
+            fh.write(body)
+    else:
+        sys.stderr.write(body.decode("utf-8") + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main(sys.argv[1:]))
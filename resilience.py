@@ -0,0 +1,262 @@
+# resilience.py
+"""
+Resiliencia hacia Xpander (por worker):
+
+- `LatencyWindow`: latencias recientes del upstream para sacar percentiles.
+- `CircuitBreaker`: si la tasa de fallas en la ventana supera el umbral se abre
+  y falla rápido durante el cooldown; después deja pasar una prueba (half-open).
+- `UpstreamGuard`: junta todo. Timeout derivado del p99 observado y, opcional,
+  un request "hedged" si el primero supera el p95 (gana el primero que termina bien).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("circuit open")
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(Exception):
+    def __init__(self, after_seconds: float):
+        super().__init__(f"upstream timeout after {after_seconds:.1f}s")
+        self.after_seconds = after_seconds
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=max(1, size))
+        self._sorted: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        s = self._sorted
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 20,
+        window: int = 50,
+        cooldown: float = 15.0,
+        probes: int = 1,
+        on_state_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probes = max(1, probes)
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = 0
+
+    @property
+    def retry_after(self) -> int:
+        if self.state != OPEN:
+            return 0
+        return max(1, int(self._opened_at + self.cooldown - time.monotonic() + 0.999))
+
+    @property
+    def is_open(self) -> bool:
+        """Sin efectos: True si ahora mismo `allow()` rechazaría por cooldown."""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing >= self.probes:
+                return False
+            self._probing += 1
+        return True
+
+    def record(self, ok: Optional[bool]) -> None:
+        """ok=None: la llamada no terminó (cancelada, error local); solo libera el slot de prueba."""
+        if self.state == HALF_OPEN:
+            self._probing = max(0, self._probing - 1)
+            if ok is True:
+                self._reset()
+                self._set(CLOSED)
+            elif ok is False:
+                self._trip()
+            return
+        if ok is None or self.state != CLOSED:
+            return
+        if len(self._outcomes) == self._outcomes.maxlen and not self._outcomes[0]:
+            self._failures -= 1
+        self._outcomes.append(ok)
+        if not ok:
+            self._failures += 1
+            n = len(self._outcomes)
+            if n >= self.min_calls and self._failures >= self.failure_ratio * n:
+                self._trip()
+
+    def _trip(self) -> None:
+        self._opened_at = time.monotonic()
+        self._reset()
+        self._set(OPEN)
+
+    def _reset(self) -> None:
+        self._outcomes.clear()
+        self._failures = 0
+        self._probing = 0
+
+    def _set(self, state: str) -> None:
+        old, self.state = self.state, state
+        if old != state and self.on_state_change:
+            self.on_state_change(old, state)
+
+
+class UpstreamGuard:
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        *,
+        max_timeout: float,
+        min_timeout: float = 5.0,
+        timeout_multiplier: float = 3.0,
+        adaptive_timeout: bool = True,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_max_ratio: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+        ignore: Tuple[Type[BaseException], ...] = (),
+        on_hedge: Optional[Callable[[str], None]] = None,
+    ):
+        self.breaker = breaker
+        self.latency = LatencyWindow(window)
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.timeout_multiplier = timeout_multiplier
+        self.adaptive_timeout = adaptive_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.min_samples = min_samples
+        self.ignore = ignore  # excepciones que no dicen nada de la salud del upstream (p.ej. pool local lleno)
+        self.on_hedge = on_hedge  # ("sent" | "won" | "skipped") -> None
+        # presupuesto de hedges: cada llamada suma `hedge_max_ratio`, cada hedge cuesta 1
+        self._hedge_tokens = 1.0
+
+    def _warm(self) -> bool:
+        return len(self.latency) >= self.min_samples
+
+    def timeout(self) -> float:
+        if not self.adaptive_timeout or not self._warm():
+            return self.max_timeout
+        p99 = self.latency.percentile(0.99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or not self._warm():
+            return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "breaker": self.breaker.state,
+            "timeout_seconds": round(self.timeout(), 3),
+            "hedge_after_seconds": None if self.hedge_delay() is None else round(self.hedge_delay(), 3),
+            "p50_seconds": None if p50 is None else round(p50, 3),
+            "p95_seconds": None if p95 is None else round(p95, 3),
+            "samples": len(self.latency),
+        }
+
+    async def call(self, attempt: Callable[[], Awaitable[Any]], failed: Callable[[Any], bool]) -> Any:
+        """
+        `attempt()` hace un intento completo; `failed(result)` dice si una respuesta
+        cuenta como falla del upstream (p.ej. 5xx). Devuelve el resultado del primer
+        intento bueno o, si ninguno lo fue, el del último (o levanta su excepción).
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(self.breaker.retry_after)
+
+        deadline = self.timeout()
+        ok: Optional[bool] = None
+        try:
+            async with asyncio.timeout(deadline):
+                result, elapsed = await self._race(attempt, failed)
+            ok = not failed(result)
+            if ok:
+                self.latency.add(elapsed)
+            return result
+        except TimeoutError:
+            ok = False
+            # muestra censurada: si el upstream se volvió más lento de verdad, el timeout se adapta
+            self.latency.add(deadline)
+            raise UpstreamTimeout(deadline) from None
+        except self.ignore:
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.breaker.record(ok)
+
+    async def _race(self, attempt, failed) -> Tuple[Any, float]:
+        async def timed():
+            t0 = time.monotonic()
+            result = await attempt()
+            return result, time.monotonic() - t0
+
+        self._hedge_tokens = min(10.0, self._hedge_tokens + self.hedge_max_ratio)
+        first = asyncio.ensure_future(timed())
+        pending = {first}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    if self._hedge_tokens >= 1.0:
+                        self._hedge_tokens -= 1.0
+                        pending.add(asyncio.ensure_future(timed()))
+                        self._hedge_event("sent")
+                    else:
+                        self._hedge_event("skipped")
+
+            last = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    last = task
+                    if task.exception() is None and not failed(task.result()[0]):
+                        if task is not first:
+                            self._hedge_event("won")
+                        return task.result()
+            return last.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _hedge_event(self, outcome: str) -> None:
+        if self.on_hedge:
+            self.on_hedge(outcome)
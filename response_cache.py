@@ -0,0 +1,113 @@
+# response_cache.py
+"""
+Cache de resultados (LRU + TTL, acotado por cantidad y por bytes) y
+coalescing de requests idénticos en vuelo (singleflight).
+
+Ambos son por proceso: cada worker de uvicorn tiene los suyos.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    `stale`: segundos extra que una entrada vencida se guarda para `get_stale`
+    (respuesta de emergencia con el upstream caído); `get` nunca la devuelve.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024, ttl: float = 300.0, stale: float = 0.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale = max(0.0, stale)
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, size, value = item
+        if expires_at <= time.monotonic():
+            if expires_at + self.stale <= time.monotonic():
+                self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Como `get`, pero acepta entradas vencidas dentro de la ventana `stale`."""
+        item = self._data.get(key)
+        if item is None or item[0] + self.stale <= time.monotonic():
+            return None
+        return item[2]
+
+    def set(self, key: Hashable, value: Any, size: int = 0) -> None:
+        if not self.enabled or size > self.max_bytes:
+            return
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        self._evict()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _pop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        # primero lo vencido (desde el más viejo), después LRU hasta entrar en los límites
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _, _) = next(iter(self._data.items()))
+            over = len(self._data) > self.max_entries or self._bytes > self.max_bytes
+            if not over and expires_at + self.stale > now:
+                break
+            self._pop(key)
+
+
+class SingleFlight:
+    """
+    Si llega una llamada con la misma key mientras otra está en vuelo,
+    espera el resultado de la primera en vez de repetir el trabajo.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Devuelve (resultado, shared). `shared=True` si se reusó una llamada en vuelo."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        # shield: si este cliente se desconecta, no cancelamos la llamada de los demás
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # evita "Task exception was never retrieved"
@@ -0,0 +1,205 @@
+# routing.py
+"""
+Ruteo por intent a agents especializados de Xpander.
+
+Cada ruta tiene su agent / invoke path y su propio pool HTTP, límite de
+concurrencia (slots de admisión), timeout y breaker: un agent lento o caído
+no consume la capacidad de los demás. Lo que no matchea ninguna ruta va a la
+`default` (`XPANDER_AGENT_ID` / `XPANDER_INVOKE_PATH` y el resto de las
+variables de siempre).
+
+Las rutas se definen en un JSON (`XPANDER_ROUTES_PATH`):
+
+    [
+      {"name": "support", "intents": ["customer_support_ai"], "agent_id": "<agent barato>",
+       "max_connections": 20, "concurrency": 10, "timeout": 20},
+      {"name": "leads", "intents": ["lead_automation"], "agent_id": "<agent pesado>"},
+      {"name": "default", "concurrency": 50}
+    ]
+
+`invoke_path` default: `/v1/agents/<agent_id>/invoke`. Una entrada `default`
+(sin `intents`) solo pisa la config de la ruta default.
+
+    python -m routing --check routes.json
+"""
+import json
+import re
+import sys
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+DEFAULT_ROUTE = "default"
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_KEYS = {
+    "name", "intents", "agent_id", "invoke_path", "base_url",
+    "max_connections", "max_keepalive", "concurrency", "timeout",
+}
+
+
+class RouteConfigError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class RouteSpec:
+    name: str
+    agent_id: str
+    invoke_path: str
+    base_url: str
+    intents: Tuple[str, ...] = ()
+    max_connections: int = 100
+    max_keepalive: int = 20
+    concurrency: int = 100  # slots de admisión (0 = sin límite)
+    timeout: float = 60.0
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.invoke_path}"
+
+
+def _invoke_path(agent_id: str) -> str:
+    return f"/v1/agents/{agent_id}/invoke"
+
+
+def parse_routes(raw: Any, default: RouteSpec) -> List[RouteSpec]:
+    """Valida la tabla; devuelve las rutas con la default primero. Levanta RouteConfigError."""
+    if not isinstance(raw, list):
+        raise RouteConfigError("se espera una lista de rutas")
+    routes: Dict[str, RouteSpec] = {DEFAULT_ROUTE: default}
+    owner: Dict[str, str] = {}
+    for i, r in enumerate(raw):
+        if not isinstance(r, dict):
+            raise RouteConfigError(f"[{i}]: se espera un objeto")
+        unknown = set(r) - _KEYS
+        if unknown:
+            raise RouteConfigError(f"[{i}]: keys desconocidas: {', '.join(sorted(unknown))}")
+        name = r.get("name")
+        if not isinstance(name, str) or not _NAME_RE.match(name):
+            raise RouteConfigError(f"[{i}]: `name` inválido (letras, números, _ . -)")
+        if name in routes and name != DEFAULT_ROUTE:
+            raise RouteConfigError(f"[{i}]: name duplicado {name!r}")
+        intents = r.get("intents", [])
+        if not isinstance(intents, list) or not all(isinstance(x, str) and x for x in intents):
+            raise RouteConfigError(f"{name}: `intents` se espera una lista de strings")
+        if name == DEFAULT_ROUTE and intents:
+            raise RouteConfigError("default: no lleva `intents` (recibe todo lo que no matchea)")
+        if name != DEFAULT_ROUTE and not intents:
+            raise RouteConfigError(f"{name}: falta `intents`")
+        for intent in intents:
+            if intent in owner:
+                raise RouteConfigError(f"{name}: el intent {intent!r} ya está en la ruta {owner[intent]!r}")
+            owner[intent] = name
+        for key in ("agent_id", "invoke_path", "base_url"):
+            if key in r and (not isinstance(r[key], str) or not r[key].strip()):
+                raise RouteConfigError(f"{name}: `{key}` tiene que ser un string no vacío")
+        if "base_url" in r and not r["base_url"].startswith(("http://", "https://")):
+            raise RouteConfigError(f"{name}: `base_url` tiene que ser http(s)")
+
+        base = default if name == DEFAULT_ROUTE else replace(default, name=name, intents=tuple(intents))
+        agent_id = r.get("agent_id", base.agent_id).strip()
+        if "invoke_path" in r:
+            path = r["invoke_path"].strip()
+        elif "agent_id" in r:
+            path = _invoke_path(agent_id)
+        else:
+            path = base.invoke_path
+        try:
+            spec = replace(
+                base,
+                agent_id=agent_id,
+                invoke_path=path,
+                base_url=r.get("base_url", base.base_url).strip().rstrip("/"),
+                max_connections=max(1, int(r.get("max_connections", base.max_connections))),
+                max_keepalive=max(0, int(r.get("max_keepalive", base.max_keepalive))),
+                concurrency=max(0, int(r.get("concurrency", r.get("max_connections", base.concurrency)))),
+                timeout=float(r.get("timeout", base.timeout)),
+            )
+        except (TypeError, ValueError) as e:
+            raise RouteConfigError(f"{name}: {e}") from None
+        if spec.timeout <= 0:
+            raise RouteConfigError(f"{name}: `timeout` tiene que ser > 0")
+        routes[name] = spec
+    return list(routes.values())
+
+
+def load_routes(path: str, default: RouteSpec) -> List[RouteSpec]:
+    with open(path, "rb") as fh:
+        try:
+            raw = json.loads(fh.read())
+        except ValueError as e:
+            raise RouteConfigError(f"JSON inválido: {e}") from None
+    return parse_routes(raw, default)
+
+
+class Route:
+    """Lo que es por ruta en runtime: pool HTTP (lazy) + guard (breaker/timeout) + slots de admisión."""
+
+    def __init__(self, spec: RouteSpec, guard: Any, admission: Any, client_factory: Callable[[], httpx.AsyncClient]):
+        self.spec = spec
+        self.guard = guard  # resilience.UpstreamGuard
+        self.admission = admission  # admission.PriorityScheduler
+        self._client_factory = client_factory
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._client_factory()
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "agent_id": self.spec.agent_id,
+            "intents": list(self.spec.intents),
+            "slots_in_use": self.admission.in_use,
+            "queued": self.admission.queued,
+            **self.guard.snapshot(),
+        }
+
+
+class RouteTable:
+    def __init__(self, routes: List[Route]):
+        self._routes = {r.name: r for r in routes}
+        self.default = self._routes[DEFAULT_ROUTE]
+        self._by_intent = {intent: r for r in routes for intent in r.spec.intents}
+
+    def __iter__(self) -> Iterator[Route]:
+        return iter(self._routes.values())
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def for_intent(self, intent_id: str) -> Route:
+        return self._by_intent.get(intent_id, self.default)
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) == 2 and argv[0] == "--check":
+        default = RouteSpec(DEFAULT_ROUTE, "<XPANDER_AGENT_ID>", "<XPANDER_INVOKE_PATH>", "<XPANDER_BASE_URL>")
+        try:
+            routes = load_routes(argv[1], default)
+        except (RouteConfigError, OSError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        for spec in routes:
+            intents = ", ".join(spec.intents) or "(resto)"
+            print(f"{spec.name}: {intents} -> {spec.agent_id} {spec.invoke_path} "
+                  f"conns={spec.max_connections} slots={spec.concurrency} timeout={spec.timeout}")
+        return 0
+    print(__doc__, file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main(sys.argv[1:]))
@@ -0,0 +1,68 @@
+# short_circuit.py
+"""
+Política de short-circuit: si el clasificador ya indica que el mensaje es
+basura o demasiado vago, respondemos un contract precalculado sin llamar a
+Xpander (latencia ~0 y costo LLM 0).
+"""
+from typing import Dict, Iterable, List, Optional
+
+from contract import normalize_contract
+
+
+class ShortCircuitPolicy:
+    def __init__(
+        self,
+        enabled: bool,
+        max_score: int,
+        intents: Iterable[str],
+        reasons: Iterable[str],
+        templates: Dict[str, List[str]],
+        summary: str = "",
+    ):
+        self.enabled = enabled
+        self.max_score = max_score
+        self.intents = frozenset(intents)
+        self.reasons = tuple(reasons)
+        # un contract por intent, armado una sola vez
+        self._responses = {
+            intent_id: normalize_contract({"summary": summary, "missing_questions": questions})
+            for intent_id, questions in templates.items()
+        }
+        self._fallback = self._responses.get("other") or normalize_contract({"summary": summary})
+
+    @classmethod
+    def from_config(cls, policy: dict, templates: Dict[str, List[str]], summary: str = "") -> "ShortCircuitPolicy":
+        return cls(
+            enabled=bool(policy.get("enabled", False)),
+            max_score=int(policy.get("max_score", 0)),
+            intents=policy.get("intents") or [],
+            reasons=policy.get("reasons") or [],
+            templates=templates,
+            summary=summary,
+        )
+
+    def match(self, intent_pack: dict) -> Optional[str]:
+        """Devuelve la regla que matcheó (para el header) si el mensaje se responde sin LLM, o None."""
+        if not self.enabled:
+            return None
+        score = intent_pack.get("score", 0)
+        if score > self.max_score:
+            return None
+        intent_id = (intent_pack.get("intent") or {}).get("id", "")
+        if self.intents and intent_id not in self.intents:
+            return None
+        if not self.reasons:
+            return f"score<={self.max_score}"
+        # todas las reasons tienen que ser de las configuradas: si además hubo una señal
+        # positiva (stack, scope, intent...) el mensaje tiene algo y va al agente
+        matched = None
+        for reason in intent_pack.get("reasons") or []:
+            prefix = next((p for p in self.reasons if reason.startswith(p)), None)
+            if prefix is None:
+                return None
+            matched = matched or prefix
+        return matched
+
+    def response(self, intent_id: str) -> dict:
+        """Contract precalculado (compartido: no mutarlo)."""
+        return self._responses.get(intent_id, self._fallback)
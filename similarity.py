@@ -0,0 +1,184 @@
+# similarity.py
+"""
+Detección de consultas casi duplicadas (MinHash + LSH) para reusar respuestas.
+
+La cache exacta (`response_cache.py`) no ve que "hola, automatizar leads de
+hubspot a slack urgente" y "buenas! automatizar leads de hubspot a slack
+urgente" piden lo mismo. Acá cada mensaje respondido se guarda como:
+
+  tokens normalizados (sin saludos/relleno) -> shingles de N palabras
+  -> firma MinHash (`num_perm` mínimos) -> `bands` buckets LSH
+
+Un mensaje nuevo solo se compara contra los que comparten algún bucket del
+mismo intent; la similitud es la fracción de mínimos iguales (estima Jaccard).
+Los números del mensaje (presupuesto, cantidades) tienen que coincidir exacto:
+"USD 800" y "USD 8000" nunca se consideran el mismo pedido.
+
+Por proceso, acotado por cantidad, bytes y TTL (LRU), igual que TTLCache.
+"""
+import hashlib
+import random
+import re
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+_P = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+# saludos, artículos y relleno que no cambian el pedido
+FILLER_WORDS = frozenset(
+    "hola holis buenas buenos buen dia dias tarde tardes noches saludos gracias muchas "
+    "favor porfa xfa equipo el la los las un una unos unas "
+    "hi hello hey thanks thank please team the an".split()
+)
+
+
+class Sketch(NamedTuple):
+    signature: array
+    numbers: FrozenSet[str]
+
+
+class _Entry(NamedTuple):
+    intent: str
+    sketch: Sketch
+    value: Any
+    size: int
+    expires_at: float
+    keys: Tuple[Hashable, ...]
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if t not in FILLER_WORDS]
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle: int = 2,
+        max_entries: int = 5000,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 3600.0,
+        seed: int = 1,
+    ):
+        if bands <= 0 or num_perm % bands:
+            raise ValueError("num_perm tiene que ser múltiplo de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = max(1, shingle)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _P), rng.randrange(0, _P)) for _ in range(num_perm)]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Hashable, Set[int]] = {}
+        self._bytes = 0
+        self._next_id = 0
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.threshold <= 1 and self.max_entries > 0 and self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def sketch(self, message: str) -> Optional[Sketch]:
+        """Firma del mensaje; None si no queda nada comparable (vacío / solo saludo)."""
+        tokens = _tokens(message)
+        if not tokens:
+            return None
+        n = min(self.shingle, len(tokens))
+        shingles = {" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles
+        ]
+        sig = array("Q", (min((a * h + b) % _P for h in hashes) for a, b in self._perms))
+        return Sketch(sig, frozenset(_NUMBER_RE.findall(message or "")))
+
+    def _band_keys(self, intent: str, sig: array) -> Tuple[Hashable, ...]:
+        r = self.rows
+        return tuple((intent, i, sig[i * r:(i + 1) * r].tobytes()) for i in range(self.bands))
+
+    def similarity(self, a: Sketch, b: Sketch) -> float:
+        if a.numbers != b.numbers:
+            return 0.0
+        same = sum(1 for x, y in zip(a.signature, b.signature) if x == y)
+        return same / self.num_perm
+
+    def lookup(self, intent: str, sketch: Sketch) -> Tuple[Optional[Any], float]:
+        """(valor, similitud) del vecino más parecido; valor=None si no pasa el umbral."""
+        candidates: Set[int] = set()
+        for key in self._band_keys(intent, sketch.signature):
+            ids = self._buckets.get(key)
+            if ids:
+                candidates |= ids
+
+        now = time.monotonic()
+        best_id, best = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry.expires_at <= now:
+                self._pop(entry_id)
+                continue
+            sim = self.similarity(sketch, entry.sketch)
+            if sim > best:
+                best_id, best = entry_id, sim
+
+        if best_id is None or best < self.threshold:
+            return None, best
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id].value, best
+
+    def add(self, intent: str, sketch: Sketch, value: Any, size: int = 0) -> None:
+        if not self.enabled or size > self.max_bytes:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        keys = self._band_keys(intent, sketch.signature)
+        self._entries[entry_id] = _Entry(intent, sketch, value, size, time.monotonic() + self.ttl, keys)
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self._bytes += size
+        self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self._bytes = 0
+
+    def _pop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size
+        for key in entry.keys:
+            ids = self._buckets.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._buckets[key]
+
+    def _evict(self) -> None:
+        # igual que TTLCache: primero lo vencido (desde el más viejo), después LRU
+        now = time.monotonic()
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            over = len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            if not over and entry.expires_at > now:
+                break
+            self._pop(entry_id)
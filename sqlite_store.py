@@ -0,0 +1,51 @@
+# sqlite_store.py
+"""
+Base de los stores SQLite compartidos entre workers de uvicorn (jobs, spool
+de webhooks): una conexión en WAL por proceso, un lock para los threads de
+ese proceso y transacciones `BEGIN IMMEDIATE` (el lock de escritura se toma
+al empezar, así dos workers no leen lo mismo y después chocan al escribir).
+
+Todo sincrónico: se llama desde threads (`asyncio.to_thread`).
+"""
+import os
+import sqlite3
+import threading
+from typing import Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+BUSY_TIMEOUT_SECONDS = 30.0  # cuánto espera una escritura si otro proceso tiene el lock
+
+
+class SqliteStore:
+    def __init__(self, path: str, schema: Iterable[str] = ()):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for stmt in schema:
+            self._db.execute(stmt)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _tx(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return out
+
+    def _read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Lectura sin transacción explícita (WAL: no bloquea a los que escriben)."""
+        with self._lock:
+            return fn(self._db)
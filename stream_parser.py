@@ -0,0 +1,284 @@
+# stream_parser.py
+"""
+Parser JSON incremental para `/invoke/stream`.
+
+Xpander devuelve un envelope cuyo `result` es el contract del agente, como
+objeto o como string JSON escapado. Acá lo consumimos a medida que llegan los
+bytes y emitimos cada campo del contract apenas termina de llegar, sin esperar
+al body completo.
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from contract import CONTRACT_KEYS
+
+# fuera de strings solo importan estos caracteres; dentro, comillas y barras
+_STRUCT_RE = re.compile(r'["{}\[\],:]')
+_STR_SPECIAL_RE = re.compile(r'["\\]')
+_SCALAR_END_RE = re.compile(r"[,}]")
+# prefijo de contenido de string JSON que se puede decodificar sin esperar más bytes
+_COMPLETE_ESCAPES_RE = re.compile(r'(?:[^\\]+|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+_HIGH_SURROGATE_TAIL_RE = re.compile(r'(?:^|[^\\])(?:\\\\)*(\\u[dD][89abAB][0-9a-fA-F]{2})$')
+
+
+class _StringDecoder:
+    """Decodifica contenido de un string JSON que llega en pedazos (escapes partidos incluidos)."""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, raw: str, final: bool = False) -> str:
+        text = self._pending + raw
+        cut = _COMPLETE_ESCAPES_RE.match(text).end()
+        if not final:
+            # un surrogate alto suelto al final espera a su par
+            tail = _HIGH_SURROGATE_TAIL_RE.search(text, 0, cut)
+            if tail:
+                cut = tail.start(1)
+        self._pending = text[cut:]
+        if not cut:
+            return ""
+        return json.loads('"' + text[:cut] + '"', strict=False)
+
+
+class ObjectStream:
+    """
+    Parser incremental de un objeto JSON top-level.
+
+    - `on_member(key, value)`: cuando un miembro top-level termina de llegar.
+    - `on_value_chunk(key, text, is_string)`: a medida que llega el valor; si es
+      string, `text` ya viene decodificado; si no, es el JSON crudo.
+
+    Ignora basura antes del primer `{` (texto del modelo, prefijos, etc.).
+    """
+
+    def __init__(
+        self,
+        on_member: Optional[Callable[[str, Any], None]] = None,
+        on_value_chunk: Optional[Callable[[str, str, bool], None]] = None,
+    ):
+        self.on_member = on_member
+        self.on_value_chunk = on_value_chunk
+        self.started = False
+        self.done = False
+        self.error: Optional[str] = None
+        self._state = "start"
+        self._key = ""
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+        self._decoder: Optional[_StringDecoder] = None
+
+    def feed(self, chunk: str) -> None:
+        i, n = 0, len(chunk)
+        while i < n and not self.done and self.error is None:
+            st = self._state
+            if st == "start":
+                j = chunk.find("{", i)
+                if j == -1:
+                    return
+                self.started = True
+                self._state = "await_key"
+                i = j + 1
+            elif st == "await_key":
+                c = chunk[i]
+                if c == '"':
+                    self._state, self._buf, self._escaped = "key", [], False
+                elif c == "}":
+                    self.done = True
+                elif c not in " \t\r\n,":
+                    self.error = "bad_key"
+                i += 1
+            elif st in ("key", "str_value"):
+                i = self._scan_string(chunk, i)
+            elif st == "colon":
+                c = chunk[i]
+                if c == ":":
+                    self._state = "value_start"
+                elif c not in " \t\r\n":
+                    self.error = "missing_colon"
+                i += 1
+            elif st == "value_start":
+                c = chunk[i]
+                if c in " \t\r\n":
+                    i += 1
+                elif c == '"':
+                    self._state, self._escaped = "str_value", False
+                    self._buf, self._decoder = [], _StringDecoder()
+                    i += 1
+                elif c in "{[":
+                    self._state, self._buf = "composite", []
+                    self._depth, self._in_str, self._escaped = 0, False, False
+                else:
+                    self._state, self._buf = "scalar", []
+            elif st == "composite":
+                i = self._scan_composite(chunk, i)
+            elif st == "scalar":
+                m = _SCALAR_END_RE.search(chunk, i)
+                end = m.start() if m else n
+                self._buf.append(chunk[i:end])
+                i = end
+                if m:
+                    self._emit_json("".join(self._buf).strip())
+                    self._state = "after_value"
+            elif st == "after_value":
+                c = chunk[i]
+                if c == ",":
+                    self._state = "await_key"
+                elif c == "}":
+                    self.done = True
+                elif c not in " \t\r\n":
+                    self.error = "bad_separator"
+                i += 1
+
+    # -- helpers --------------------------------------------------------
+    def _scan_string(self, chunk: str, i: int) -> int:
+        """Avanza dentro de un string (key o valor) hasta la comilla de cierre."""
+        start, n = i, len(chunk)
+        while i < n:
+            if self._escaped:
+                self._escaped = False
+                i += 1
+                continue
+            m = _STR_SPECIAL_RE.search(chunk, i)
+            if m is None:
+                i = n
+                break
+            i = m.start()
+            if chunk[i] == "\\":
+                self._escaped = True
+                i += 1
+                continue
+            # comilla de cierre
+            self._string_piece(chunk[start:i], final=True)
+            if self._state == "key":
+                self._key = json.loads('"' + "".join(self._buf) + '"', strict=False)
+                self._state = "colon"
+            else:
+                self._member("".join(self._buf))
+                self._state = "after_value"
+            return i + 1
+        self._string_piece(chunk[start:i], final=False)
+        return i
+
+    def _string_piece(self, raw: str, final: bool) -> None:
+        if self._state == "key":
+            self._buf.append(raw)
+            return
+        text = self._decoder.feed(raw, final=final)
+        if text:
+            self._buf.append(text)
+            if self.on_value_chunk:
+                self.on_value_chunk(self._key, text, True)
+
+    def _scan_composite(self, chunk: str, i: int) -> int:
+        start, n = i, len(chunk)
+        while i < n:
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                    i += 1
+                    continue
+                m = _STR_SPECIAL_RE.search(chunk, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.start() + 1
+                if chunk[m.start()] == "\\":
+                    self._escaped = True
+                else:
+                    self._in_str = False
+                continue
+            m = _STRUCT_RE.search(chunk, i)
+            if m is None:
+                i = n
+                break
+            c = chunk[m.start()]
+            i = m.start() + 1
+            if c == '"':
+                self._in_str = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._composite_piece(chunk[start:i])
+                    self._emit_json("".join(self._buf))
+                    self._state = "after_value"
+                    return i
+        self._composite_piece(chunk[start:i])
+        return i
+
+    def _composite_piece(self, raw: str) -> None:
+        if raw:
+            self._buf.append(raw)
+            if self.on_value_chunk:
+                self.on_value_chunk(self._key, raw, False)
+
+    def _emit_json(self, raw: str) -> None:
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self.error = "bad_value"
+            return
+        self._member(value)
+
+    def _member(self, value: Any) -> None:
+        if self.on_member:
+            self.on_member(self._key, value)
+
+
+class ContractStream:
+    """
+    Envelope de Xpander (en pedazos) -> campos del contract a medida que se completan.
+
+    `feed()` devuelve los (key, value) nuevos; `fields` acumula todos y
+    `take_text()` devuelve el texto crudo del agente que fue llegando.
+    Soporta `result` como objeto, como string JSON escapado, o el contract
+    directo en el top-level del envelope.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._new: List[Tuple[str, Any]] = []
+        self._text: List[str] = []
+        self._chunks: List[str] = []
+        self._inner = ObjectStream(on_member=self._on_field)
+        self._outer = ObjectStream(on_member=self._on_outer_member, on_value_chunk=self._on_outer_chunk)
+
+    @property
+    def body(self) -> str:
+        return "".join(self._chunks)
+
+    @property
+    def complete(self) -> bool:
+        """True si se parseó un contract completo (objeto cerrado)."""
+        return self._inner.done or (self._outer.done and not self._inner.started and bool(self.fields))
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        if text:
+            self._chunks.append(text)
+            self._outer.feed(text)
+        new, self._new = self._new, []
+        return new
+
+    def take_text(self) -> str:
+        """Texto del agente (`result`) recibido desde la última llamada."""
+        text, self._text = "".join(self._text), []
+        return text
+
+    def _on_outer_chunk(self, key: str, text: str, is_string: bool) -> None:
+        if key == "result":
+            self._text.append(text)
+            self._inner.feed(text)
+
+    def _on_outer_member(self, key: str, value: Any) -> None:
+        if key in CONTRACT_KEYS and not self._inner.started:
+            self._on_field(key, value)
+
+    def _on_field(self, key: str, value: Any) -> None:
+        if key in CONTRACT_KEYS:
+            self.fields[key] = value
+            self._new.append((key, value))
@@ -0,0 +1,75 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+import webhooks
+
+
+class _Recorder:
+    """Network backend falso: registra a qué host se conecta y corta ahí."""
+
+    def __init__(self):
+        self.hosts = []
+
+    async def connect_tcp(self, host, port, **kwargs):
+        self.hosts.append(host)
+        raise OSError("no network in tests")
+
+    async def sleep(self, seconds):
+        pass
+
+
+def _fake_dns(monkeypatch, answers):
+    """Cada llamada a getaddrinfo devuelve la siguiente IP de `answers` (DNS rebinding)."""
+    answers = list(answers)
+
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (answers.pop(0), port))]
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+
+
+@pytest.mark.parametrize("url, reason", [
+    ("http://127.0.0.1/cb", "private_address"),
+    ("http://10.1.2.3/cb", "private_address"),
+    ("http://169.254.169.254/latest/meta-data", "private_address"),
+    ("http://[::1]/cb", "private_address"),
+    ("ftp://example.com/cb", "invalid_url"),
+    ("http://8.8.8.8/cb", None),
+])
+def test_check_target_without_allowlist(url, reason):
+    assert asyncio.run(webhooks.check_target(url, ())) == reason
+
+
+def test_check_target_allowlist():
+    allowed = ("crm.example.com", ".hooks.example.com")
+    assert asyncio.run(webhooks.check_target("https://crm.example.com/x", allowed)) is None
+    assert asyncio.run(webhooks.check_target("https://a.hooks.example.com/x", allowed)) is None
+    assert asyncio.run(webhooks.check_target("https://evil.com/x", allowed)) == "host_not_allowed"
+
+
+def test_connect_uses_the_checked_address(monkeypatch):
+    # primera resolución pública, la segunda apuntaría a metadata: nunca se usa
+    _fake_dns(monkeypatch, ["93.184.215.14", "169.254.169.254"])
+    inner = _Recorder()
+    backend = webhooks._CheckedBackend(inner, ())
+    with pytest.raises(OSError):
+        asyncio.run(backend.connect_tcp("rebind.example", 80))
+    assert inner.hosts == ["93.184.215.14"]
+
+
+def test_connect_rejects_private_resolution(monkeypatch):
+    _fake_dns(monkeypatch, ["127.0.0.1"])
+    inner = _Recorder()
+    client = webhooks.callback_client(2, ())
+    client._transport._pool._network_backend.inner = inner
+
+    async def main():
+        async with client:
+            with pytest.raises(httpx.ConnectError, match="private_address"):
+                await client.post("http://rebind.example/cb", content=b"{}")
+
+    asyncio.run(main())
+    assert inner.hosts == []
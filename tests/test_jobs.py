@@ -0,0 +1,53 @@
+import asyncio
+
+from jobs import JobManager
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+
+def test_stop_mid_job_requeues_it(tmp_path):
+    store = str(tmp_path / "jobs.db")
+
+    async def main():
+        started = asyncio.Event()
+
+        async def hang(job):
+            started.set()
+            await asyncio.Event().wait()
+
+        first = JobManager(hang, store_path=store, workers=1, poll_seconds=0.05, lease_seconds=300)
+        await first.start()
+        job = await first.submit("hola", {"intent": {"id": "other"}}, callback_url="https://example.com/cb")
+        await asyncio.wait_for(started.wait(), 5)
+        assert (await first.get(job.id)).status == "running"
+        await first.stop()
+
+        # el lease es largo: si no se liberó, el próximo proceso no lo toma en este test
+        finished = []
+
+        async def on_finished(j):
+            finished.append(j.id)
+
+        async def ok(j):
+            return {"summary": j.message}
+
+        second = JobManager(ok, store_path=store, workers=1, poll_seconds=0.05, lease_seconds=300,
+                            on_finished=on_finished)
+        await second.start()
+        try:
+            requeued = await second.get(job.id)
+            assert requeued.status in ("queued", "running", "done")
+            assert requeued.error is None
+            done = await second.wait(requeued, 5)
+            assert done.status == "done"
+            assert done.result == {"summary": "hola"}
+            await _wait_for(lambda: finished == [job.id])
+        finally:
+            await second.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+import pytest
+
+from intent_classifier import classify_intent_and_score
+from intent_config import MISSING_QUESTIONS_TEMPLATES, SHORT_CIRCUIT_POLICY, SHORT_CIRCUIT_SUMMARY
+from short_circuit import ShortCircuitPolicy
+
+
+def _default_policy() -> ShortCircuitPolicy:
+    return ShortCircuitPolicy.from_config(
+        SHORT_CIRCUIT_POLICY, MISSING_QUESTIONS_TEMPLATES, SHORT_CIRCUIT_SUMMARY,
+    )
+
+
+@pytest.mark.parametrize("message", [
+    "Hola! Queremos un chatbot para soporte de tickets",
+    "Need a mapping from zendesk tickets into our helpdesk faq",
+    "shopping cart leads into crm",
+])
+def test_real_leads_go_to_the_agent(message):
+    assert _default_policy().match(classify_intent_and_score(message)) is None
+
+
+@pytest.mark.parametrize("message", ["hola", "ping", "test", "Prueba!"])
+def test_vague_messages_short_circuit(message):
+    assert _default_policy().match(classify_intent_and_score(message)) == "vague_penalty"
+
+
+@pytest.mark.parametrize("message, vague", [
+    ("Need a mapping from zendesk tickets into our helpdesk faq", False),
+    ("shopping cart leads into crm", False),
+    ("testing the new pipeline", False),
+    ("ping", True),
+    ("hola, una consulta", True),
+])
+def test_vague_keywords_match_whole_words(message, vague):
+    reasons = classify_intent_and_score(message)["reasons"]
+    assert any(r.startswith("vague_penalty") for r in reasons) is vague
+
+
+def test_positive_signal_skips_short_circuit():
+    pack = {"intent": {"id": "other"}, "score": 0, "reasons": ["vague_penalty(test)", "has_stack(slack)"]}
+    assert _default_policy().match(pack) is None
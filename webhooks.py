@@ -0,0 +1,605 @@
+# webhooks.py
+"""
+Fan-out de resultados (intent, score, contract) a sistemas externos (CRM,
+Slack, Notion...) después de responder, sin sumar latencia al request.
+
+- `enqueue()` solo filtra y encola en memoria (put_nowait). Si el buffer está
+  lleno el evento se descarta y se cuenta.
+- Un task de fondo pasa lo encolado al spool SQLite (`WEBHOOKS_SPOOL_PATH`) en
+  un thread; otro entrega: por sink toma lo pendiente, manda arrays de hasta
+  `batch` items (o de a uno si el sink no acepta arrays), borra lo entregado y
+  reprograma lo que falló con backoff exponencial + jitter. Después de
+  `max_attempts` (o un 4xx que no sea 408/429) la fila queda como `dead`.
+- El spool es compartido entre workers: cada fila se "alquila" (lease) al
+  tomarla, así que dos workers no mandan lo mismo y, si uno muere a mitad de
+  camino, otro la retoma al vencer el lease. Entrega at-least-once: cada
+  payload trae `id` para deduplicar del lado del sink.
+
+También entrega los `callback_url` de `/jobs` (`callback_dispatcher()`): un
+sink reservado (`jobs:callback`) con la URL de cada fila, el mismo spool y los
+mismos reintentos. El destino se chequea al aceptar la URL (`check_target()`)
+y en cada connect del cliente de callbacks, que se conecta a la misma IP que
+chequeó: solo hosts de `JOBS_CALLBACK_HOSTS` o, sin lista, hosts que
+resuelven a IPs públicas.
+
+Los sinks se definen en un JSON (`WEBHOOKS_PATH`; vacío = desactivado):
+
+    [
+      {"name": "crm", "url": "https://crm.example/hooks/intake", "intents": ["lead_automation"],
+       "min_score": 60, "batch": 50, "headers": {"Authorization": "Bearer ..."}},
+      {"name": "slack", "url": "https://hooks.slack.com/services/...", "min_score": 90}
+    ]
+
+    python -m webhooks --check webhooks.json    # validar antes de deployar
+    python -m webhooks --stats                  # pendientes / dead por sink
+    python -m webhooks --requeue-dead [sink]    # reintentar los dead
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import re
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+from contract import dumps
+from sqlite_store import SqliteStore
+
+WEBHOOKS_PATH = os.getenv("WEBHOOKS_PATH", "").strip()
+WEBHOOKS_SPOOL_PATH = os.getenv("WEBHOOKS_SPOOL_PATH", "webhooks-spool.db").strip()
+WEBHOOKS_BUFFER = int(os.getenv("WEBHOOKS_BUFFER", "10000"))
+WEBHOOKS_MAX_SPOOL = int(os.getenv("WEBHOOKS_MAX_SPOOL", "100000"))  # filas pendientes; más se descartan
+WEBHOOKS_POLL_SECONDS = float(os.getenv("WEBHOOKS_POLL_SECONDS", "2"))
+WEBHOOKS_LINGER_SECONDS = float(os.getenv("WEBHOOKS_LINGER_SECONDS", "0.2"))  # junta items antes de mandar
+WEBHOOKS_CONCURRENCY = int(os.getenv("WEBHOOKS_CONCURRENCY", "4"))  # POSTs en vuelo por sink
+WEBHOOKS_MAX_CONNECTIONS = int(os.getenv("WEBHOOKS_MAX_CONNECTIONS", "20"))
+WEBHOOKS_TIMEOUT = float(os.getenv("WEBHOOKS_TIMEOUT", "10"))
+WEBHOOKS_MAX_ATTEMPTS = int(os.getenv("WEBHOOKS_MAX_ATTEMPTS", "8"))
+WEBHOOKS_BACKOFF_BASE = float(os.getenv("WEBHOOKS_BACKOFF_BASE", "1"))
+WEBHOOKS_BACKOFF_MAX = float(os.getenv("WEBHOOKS_BACKOFF_MAX", "300"))
+WEBHOOKS_LEASE_SECONDS = float(os.getenv("WEBHOOKS_LEASE_SECONDS", "60"))
+
+# callbacks de /jobs: hosts permitidos ("crm.example.com", ".example.com" = subdominios).
+# Vacío = cualquier host que resuelva solo a IPs públicas (nada de loopback / red interna).
+JOBS_CALLBACK_HOSTS = tuple(h.strip().lower() for h in os.getenv("JOBS_CALLBACK_HOSTS", "").split(",") if h.strip())
+JOBS_CALLBACK_TIMEOUT = float(os.getenv("JOBS_CALLBACK_TIMEOUT", "10"))
+JOBS_CALLBACK_MAX_ATTEMPTS = int(os.getenv("JOBS_CALLBACK_MAX_ATTEMPTS", "5"))
+CALLBACK_SINK = "jobs:callback"  # fuera de _NAME_RE: no choca con un sink configurado
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class WebhookConfigError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Sink:
+    name: str
+    url: str
+    intents: Tuple[str, ...] = ()  # vacío = todos
+    min_score: int = 0
+    batch: int = 1  # > 1: el sink acepta un array JSON de hasta `batch` items
+    headers: Dict[str, str] = field(default_factory=dict)
+    timeout: float = WEBHOOKS_TIMEOUT
+    max_attempts: int = WEBHOOKS_MAX_ATTEMPTS
+
+    def matches(self, intent_id: str, score: int) -> bool:
+        return score >= self.min_score and (not self.intents or intent_id in self.intents)
+
+
+def parse_sinks(raw: Any) -> List[Sink]:
+    """Valida la lista de sinks. Levanta WebhookConfigError."""
+    if not isinstance(raw, list):
+        raise WebhookConfigError("se espera una lista de sinks")
+    sinks, seen = [], set()
+    for i, s in enumerate(raw):
+        if not isinstance(s, dict):
+            raise WebhookConfigError(f"[{i}]: se espera un objeto")
+        unknown = set(s) - {"name", "url", "intents", "min_score", "batch", "headers", "timeout", "max_attempts"}
+        if unknown:
+            raise WebhookConfigError(f"[{i}]: keys desconocidas: {', '.join(sorted(unknown))}")
+        name = s.get("name")
+        if not isinstance(name, str) or not _NAME_RE.match(name):
+            raise WebhookConfigError(f"[{i}]: `name` inválido (letras, números, _ . -)")
+        if name in seen:
+            raise WebhookConfigError(f"[{i}]: name duplicado {name!r}")
+        seen.add(name)
+        url = s.get("url")
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            raise WebhookConfigError(f"{name}: `url` tiene que ser http(s)")
+        intents = s.get("intents", [])
+        if not isinstance(intents, list) or not all(isinstance(x, str) for x in intents):
+            raise WebhookConfigError(f"{name}: `intents` se espera una lista de strings")
+        headers = s.get("headers", {})
+        if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+            raise WebhookConfigError(f"{name}: `headers` se espera un objeto de strings")
+        try:
+            sink = Sink(
+                name=name,
+                url=url,
+                intents=tuple(intents),
+                min_score=int(s.get("min_score", 0)),
+                batch=max(1, int(s.get("batch", 1))),
+                headers=dict(headers),
+                timeout=float(s.get("timeout", WEBHOOKS_TIMEOUT)),
+                max_attempts=max(1, int(s.get("max_attempts", WEBHOOKS_MAX_ATTEMPTS))),
+            )
+        except (TypeError, ValueError) as e:
+            raise WebhookConfigError(f"{name}: {e}") from None
+        sinks.append(sink)
+    return sinks
+
+
+def load_sinks(path: str) -> List[Sink]:
+    with open(path, "rb") as fh:
+        try:
+            raw = json.loads(fh.read())
+        except ValueError as e:
+            raise WebhookConfigError(f"JSON inválido: {e}") from None
+    return parse_sinks(raw)
+
+
+# =====================
+# Spool (SQLite, compartido entre workers). Todo sincrónico: se llama desde threads.
+# =====================
+class Spool(SqliteStore):
+    def __init__(self, path: str):
+        super().__init__(path, [
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, sink TEXT NOT NULL, payload BLOB NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL, lease_until REAL NOT NULL DEFAULT 0,"
+            " owner TEXT, dead INTEGER NOT NULL DEFAULT 0, last_error TEXT, created_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS spool_due ON spool (sink, dead, next_at)",
+        ])
+        # url por fila (callbacks de jobs); spools viejos no la tienen
+        if "url" not in {r[1] for r in self._db.execute("PRAGMA table_info(spool)")}:
+            try:
+                self._db.execute("ALTER TABLE spool ADD COLUMN url TEXT")
+            except sqlite3.OperationalError:
+                pass  # la agregó otro worker al mismo tiempo
+
+    def pending(self) -> int:
+        return self._read(lambda db: db.execute("SELECT COUNT(*) FROM spool WHERE dead = 0").fetchone()[0])
+
+    def insert(self, rows: List[Tuple[str, bytes, Optional[str]]], max_pending: int) -> int:
+        """Inserta (sink, payload, url); devuelve cuántas entraron (el resto excede `max_pending`)."""
+        def run(db):
+            room = max_pending - db.execute("SELECT COUNT(*) FROM spool WHERE dead = 0").fetchone()[0]
+            keep = rows[:max(0, room)]
+            now = time.time()
+            db.executemany(
+                "INSERT INTO spool (sink, payload, url, next_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(sink, payload, url, now, now) for sink, payload, url in keep],
+            )
+            return len(keep)
+        return self._tx(run)
+
+    def claim(self, sink: str, limit: int, owner: str, lease: float) -> List[Tuple[int, bytes, int, Optional[str]]]:
+        """Toma hasta `limit` filas vencidas del sink y las alquila `lease` segundos."""
+        def run(db):
+            now = time.time()
+            rows = db.execute(
+                "SELECT id, payload, attempts, url FROM spool"
+                " WHERE sink = ? AND dead = 0 AND next_at <= ? AND lease_until <= ? ORDER BY id LIMIT ?",
+                (sink, now, now, limit),
+            ).fetchall()
+            if rows:
+                db.executemany(
+                    "UPDATE spool SET lease_until = ?, owner = ? WHERE id = ?",
+                    [(now + lease, owner, r[0]) for r in rows],
+                )
+            return rows
+        return self._tx(run)
+
+    def ack(self, ids: List[int]) -> None:
+        self._tx(lambda db: db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids]))
+
+    def fail(self, updates: List[Tuple[int, int, float, bool]], error: str) -> None:
+        """`updates`: (id, attempts, next_at, dead)."""
+        self._tx(lambda db: db.executemany(
+            "UPDATE spool SET attempts = ?, next_at = ?, dead = ?, last_error = ?, lease_until = 0, owner = NULL"
+            " WHERE id = ?",
+            [(attempts, next_at, int(dead), error[:500], i) for i, attempts, next_at, dead in updates],
+        ))
+
+    def release(self, owner: str) -> None:
+        """Devuelve las filas alquiladas por `owner` (shutdown): otro worker las retoma ya."""
+        self._tx(lambda db: db.execute("UPDATE spool SET lease_until = 0, owner = NULL WHERE owner = ?", (owner,)))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        rows = self._read(lambda db: db.execute("SELECT sink, dead, COUNT(*) FROM spool GROUP BY sink, dead").fetchall())
+        out: Dict[str, Dict[str, int]] = {}
+        for sink, dead, n in rows:
+            out.setdefault(sink, {"pending": 0, "dead": 0})["dead" if dead else "pending"] = n
+        return out
+
+    def requeue_dead(self, sink: Optional[str] = None) -> int:
+        def run(db):
+            sql = "UPDATE spool SET dead = 0, attempts = 0, next_at = ? WHERE dead = 1"
+            args: list = [time.time()]
+            if sink:
+                sql += " AND sink = ?"
+                args.append(sink)
+            return db.execute(sql, args).rowcount
+        return self._tx(run)
+
+
+# =====================
+# Dispatcher (por worker)
+# =====================
+class WebhookDispatcher:
+    def __init__(
+        self,
+        sinks: List[Sink],
+        spool_path: str,
+        *,
+        buffer: int = 10000,
+        max_spool: int = 100000,
+        poll_seconds: float = 2.0,
+        linger: float = 0.2,
+        concurrency: int = 4,
+        max_connections: int = 20,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        lease_seconds: float = 60.0,
+        client_factory: Optional[Callable[[], httpx.AsyncClient]] = None,
+        on_delivery: Optional[Callable[[str, str, int, float], None]] = None,
+        on_drop: Optional[Callable[[int], None]] = None,
+        on_spool: Optional[Callable[[int], None]] = None,
+    ):
+        self.sinks = sinks
+        self.spool_path = spool_path
+        self.max_spool = max_spool
+        self.poll_seconds = poll_seconds
+        self.linger = linger
+        self.concurrency = max(1, concurrency)
+        self.max_connections = max_connections
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.client_factory = client_factory
+        self.on_delivery = on_delivery  # (sink, outcome, items, seconds) -> None; outcome: ok|retry|dead
+        self.on_drop = on_drop  # (items) -> None
+        self.on_spool = on_spool  # (pendientes en el spool) -> None
+        self.dropped = 0
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._buffer: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer))
+        self._wakeup = asyncio.Event()
+        self._spool: Optional[Spool] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def enqueue(self, event: Dict[str, Any]) -> int:
+        """Encola `event` para cada sink cuyo filtro matchee; devuelve para cuántos. No hace I/O."""
+        if not self.enabled:
+            return 0
+        targets = [s.name for s in self.sinks if s.matches(event.get("intent") or "", event.get("score") or 0)]
+        if not targets:
+            return 0
+        event.setdefault("id", uuid.uuid4().hex)
+        event.setdefault("ts", round(time.time(), 3))
+        payload = dumps(event)
+        queued = 0
+        for name in targets:
+            queued += self._put(name, payload, None)
+        return queued
+
+    def enqueue_to(self, sink: str, url: str, event: Dict[str, Any]) -> bool:
+        """Encola `event` para `url` (pisa la del sink; ej. callbacks). No hace I/O."""
+        if not self.enabled:
+            return False
+        event.setdefault("id", uuid.uuid4().hex)
+        event.setdefault("ts", round(time.time(), 3))
+        return bool(self._put(sink, dumps(event), url))
+
+    def _put(self, sink: str, payload: bytes, url: Optional[str]) -> int:
+        try:
+            self._buffer.put_nowait((sink, payload, url))
+            return 1
+        except asyncio.QueueFull:
+            self._dropped(1)
+            return 0
+
+    # -- lifecycle ------------------------------------------------------
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self._spool = await asyncio.to_thread(Spool, self.spool_path)
+        self._client = self.client_factory() if self.client_factory else httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+        )
+        self._tasks = [asyncio.create_task(self._persist_loop()), asyncio.create_task(self._deliver_loop())]
+        # el sink reservado de callbacks no es un webhook configurado: se loguea aparte
+        names = [s.name for s in self.sinks if s.name != CALLBACK_SINK]
+        if names:
+            print(f"[webhooks] {len(names)} sinks ({', '.join(names)}), spool {self.spool_path}")
+        if len(names) < len(self.sinks):
+            print(f"[webhooks] callbacks de jobs ({CALLBACK_SINK}), spool {self.spool_path}")
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._spool is not None:
+            # lo que quedó en memoria va al spool: se entrega al volver a levantar
+            await asyncio.to_thread(self._flush_buffer)
+            await asyncio.to_thread(self._spool.release, self._owner)
+            await asyncio.to_thread(self._spool.close)
+            self._spool = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -- buffer -> spool ------------------------------------------------
+    def _drain(self) -> List[Tuple[str, bytes, Optional[str]]]:
+        rows = []
+        while True:
+            try:
+                rows.append(self._buffer.get_nowait())
+            except asyncio.QueueEmpty:
+                return rows
+
+    def _flush_buffer(self) -> None:
+        rows = self._drain()
+        if rows:
+            self._store(rows)
+
+    def _store(self, rows: List[Tuple[str, bytes, Optional[str]]]) -> None:
+        stored = self._spool.insert(rows, self.max_spool)
+        if stored < len(rows):
+            self._dropped(len(rows) - stored)
+
+    async def _persist_loop(self) -> None:
+        while True:
+            rows = [await self._buffer.get()]
+            rows.extend(self._drain())
+            try:
+                await asyncio.to_thread(self._store, rows)
+            except sqlite3.Error as e:
+                self._dropped(len(rows))
+                print("[webhooks] error escribiendo el spool -", e)
+                continue
+            self._wakeup.set()
+
+    def _dropped(self, n: int) -> None:
+        self.dropped += n
+        if self.on_drop:
+            self.on_drop(n)
+
+    # -- entrega --------------------------------------------------------
+    async def _deliver_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                if self.linger > 0:
+                    await asyncio.sleep(self.linger)  # micro-batching: deja juntar más items
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.gather(*(self._deliver_sink(s) for s in self.sinks))
+                if self.on_spool:
+                    self.on_spool(await asyncio.to_thread(self._spool.pending))
+            except Exception as e:
+                # nunca se corta el loop: lo que no se pudo marcar vuelve al vencer el lease
+                print("[webhooks] error en la entrega -", type(e).__name__, e)
+
+    async def _deliver_sink(self, sink: Sink) -> None:
+        limit = sink.batch * self.concurrency
+        while True:
+            rows = await asyncio.to_thread(self._spool.claim, sink.name, limit, self._owner, self.lease_seconds)
+            if not rows:
+                return
+            chunks = [rows[i:i + sink.batch] for i in range(0, len(rows), sink.batch)]
+            await asyncio.gather(*(self._send(sink, chunk) for chunk in chunks))
+            if len(rows) < limit:
+                return
+
+    async def _send(self, sink: Sink, rows: List[Tuple[int, bytes, int, Optional[str]]]) -> None:
+        if sink.batch > 1:
+            body = b"[" + b",".join(r[1] for r in rows) + b"]"
+        else:
+            body = rows[0][1]
+        url = rows[0][3] or sink.url  # con url por fila el sink es batch=1
+        headers = {"Content-Type": "application/json", **sink.headers}
+        t0 = time.monotonic()
+        retry_after = 0.0
+        try:
+            r = await self._client.post(url, content=body, headers=headers, timeout=sink.timeout)
+            status = r.status_code
+            error = f"HTTP {status}"
+            if status in (429, 503):
+                try:
+                    retry_after = float(r.headers.get("retry-after", 0))
+                except ValueError:
+                    pass
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            status = 0
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.monotonic() - t0
+
+        if 200 <= status < 300:
+            await asyncio.to_thread(self._spool.ack, [r[0] for r in rows])
+            self._delivered(sink, "ok", len(rows), elapsed)
+            return
+
+        # 4xx (salvo 408/429) no se arregla reintentando
+        permanent = 400 <= status < 500 and status not in (408, 429)
+        now = time.time()
+        updates = []
+        for row_id, _, attempts, _ in rows:
+            attempts += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+            dead = permanent or attempts >= sink.max_attempts
+            updates.append((row_id, attempts, now + max(delay, retry_after), dead))
+        await asyncio.to_thread(self._spool.fail, updates, error)
+        dead_n = sum(1 for u in updates if u[3])
+        if dead_n:
+            self._delivered(sink, "dead", dead_n, elapsed)
+            print(f"[webhooks] {sink.name}: {dead_n} items dead -", error)
+        if len(updates) > dead_n:
+            self._delivered(sink, "retry", len(updates) - dead_n, elapsed)
+
+    def _delivered(self, sink: Sink, outcome: str, items: int, seconds: float) -> None:
+        if self.on_delivery:
+            self.on_delivery(sink.name, outcome, items, seconds)
+
+
+def from_env(**kwargs: Any) -> WebhookDispatcher:
+    """Dispatcher con la config de env (sin `WEBHOOKS_PATH`: desactivado)."""
+    sinks = load_sinks(WEBHOOKS_PATH) if WEBHOOKS_PATH else []
+    return WebhookDispatcher(
+        sinks,
+        WEBHOOKS_SPOOL_PATH,
+        buffer=WEBHOOKS_BUFFER,
+        max_spool=WEBHOOKS_MAX_SPOOL,
+        poll_seconds=WEBHOOKS_POLL_SECONDS,
+        linger=WEBHOOKS_LINGER_SECONDS,
+        concurrency=WEBHOOKS_CONCURRENCY,
+        max_connections=WEBHOOKS_MAX_CONNECTIONS,
+        backoff_base=WEBHOOKS_BACKOFF_BASE,
+        backoff_max=WEBHOOKS_BACKOFF_MAX,
+        lease_seconds=WEBHOOKS_LEASE_SECONDS,
+        **kwargs,
+    )
+
+
+# =====================
+# Callbacks de /jobs
+# =====================
+def _host_allowed(host: str, allowed: Tuple[str, ...]) -> bool:
+    return any(host == h or (h.startswith(".") and host.endswith(h)) for h in allowed)
+
+
+async def _resolve_target(host: str, port: int, allowed_hosts: Tuple[str, ...]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (motivo, ip). Con allowlist: el host tiene que estar y se conecta por nombre
+    (ip None). Sin allowlist: todas las IPs del host tienen que ser públicas y
+    la ip devuelta es una de esas (a la que hay que conectarse).
+    """
+    host = host.lower()
+    if allowed_hosts:
+        return (None, None) if _host_allowed(host, allowed_hosts) else ("host_not_allowed", None)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return "unresolvable_host", None
+    if not infos:
+        return "unresolvable_host", None
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split("%", 1)[0]).is_global:
+            return "private_address", None
+    return None, infos[0][4][0]
+
+
+async def check_target(url: str, allowed_hosts: Tuple[str, ...] = JOBS_CALLBACK_HOSTS) -> Optional[str]:
+    """None si se le puede mandar a `url`; si no, el motivo (para no pegarle a la red interna)."""
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        return "invalid_url"
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "invalid_url"
+    return (await _resolve_target(parts.hostname, port, allowed_hosts))[0]
+
+
+class _CheckedBackend(httpcore.AsyncNetworkBackend):
+    """
+    Chequea el destino en el connect y se conecta a la IP que se chequeó: si el
+    DNS cambia entre el chequeo y el connect (DNS rebinding) no hay una segunda
+    resolución que lo aproveche. TLS/SNI siguen usando el hostname.
+    """
+
+    def __init__(self, inner: httpcore.AsyncNetworkBackend, allowed_hosts: Tuple[str, ...]):
+        self.inner = inner
+        self.allowed_hosts = allowed_hosts
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        reason, ip = await _resolve_target(host, port, self.allowed_hosts)
+        if reason:
+            raise httpcore.ConnectError(f"destino no permitido ({host}): {reason}")
+        return await self.inner.connect_tcp(
+            ip or host, port, timeout=timeout, local_address=local_address, socket_options=socket_options,
+        )
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("destino no permitido: unix socket")
+
+    async def sleep(self, seconds: float) -> None:
+        await self.inner.sleep(seconds)
+
+
+def callback_client(max_connections: int, allowed_hosts: Tuple[str, ...] = JOBS_CALLBACK_HOSTS) -> httpx.AsyncClient:
+    """Cliente para callbacks: sin proxies del entorno ni redirects, y con el destino chequeado en cada connect."""
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+    # httpx no deja pasar el network backend: se envuelve el del pool de httpcore
+    pool = transport._pool
+    pool._network_backend = _CheckedBackend(pool._network_backend, allowed_hosts)
+    return httpx.AsyncClient(transport=transport, trust_env=False, follow_redirects=False)
+
+
+def callback_dispatcher(**kwargs: Any) -> WebhookDispatcher:
+    """Dispatcher para los `callback_url` de jobs: mismo spool, un sink reservado con url por fila."""
+    sink = Sink(
+        name=CALLBACK_SINK,
+        url="",
+        timeout=JOBS_CALLBACK_TIMEOUT,
+        max_attempts=max(1, JOBS_CALLBACK_MAX_ATTEMPTS),
+    )
+    return WebhookDispatcher(
+        [sink],
+        WEBHOOKS_SPOOL_PATH,
+        buffer=WEBHOOKS_BUFFER,
+        max_spool=WEBHOOKS_MAX_SPOOL,
+        poll_seconds=WEBHOOKS_POLL_SECONDS,
+        linger=0,
+        concurrency=WEBHOOKS_CONCURRENCY,
+        max_connections=WEBHOOKS_MAX_CONNECTIONS,
+        backoff_base=WEBHOOKS_BACKOFF_BASE,
+        backoff_max=WEBHOOKS_BACKOFF_MAX,
+        lease_seconds=WEBHOOKS_LEASE_SECONDS,
+        **{"client_factory": lambda: callback_client(WEBHOOKS_MAX_CONNECTIONS), **kwargs},
+    )
+
+
+def _main(argv: List[str]) -> int:
+    try:
+        if len(argv) == 2 and argv[0] == "--check":
+            sinks = load_sinks(argv[1])
+            print(f"ok {len(sinks)} sinks: {', '.join(s.name for s in sinks)}")
+            return 0
+        if argv == ["--stats"]:
+            print(json.dumps(Spool(WEBHOOKS_SPOOL_PATH).stats(), indent=2))
+            return 0
+        if argv[:1] == ["--requeue-dead"] and len(argv) <= 2:
+            n = Spool(WEBHOOKS_SPOOL_PATH).requeue_dead(argv[1] if len(argv) == 2 else None)
+            print(f"ok {n} items reencolados")
+            return 0
+    except (WebhookConfigError, OSError, sqlite3.Error) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(__doc__, file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main(sys.argv[1:]))
@@ -1,14 +1,25 @@
 import os
 import json
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
-from xpander_sdk import Task, on_task, Backend, Tokens
+from xpander_sdk import Task, on_task, Backend, Tokens, Agents
+from xpander_sdk.models.shared import ThinkMode
 from agno.agent import Agent
 from intent_classifier import classify_intent_and_score
+from response_cache import SingleFlight, TTLCache
+import config_store
+import event_log
 
 API_KEY = os.getenv("INTAKE_API_KEY", "").strip()
 
+# Cache de agentes Agno armados (por worker). 0 = armar uno por task como antes.
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "300"))
+AGENT_CACHE_MAX = int(os.getenv("AGENT_CACHE_MAX", "16"))
+
 def _cfg_to_dict(cfg):
     if cfg is None:
         return {}
@@ -16,7 +27,8 @@ def _cfg_to_dict(cfg):
         return cfg
     if hasattr(cfg, "model_dump"):
         try:
-            return cfg.model_dump()
+            # `state` es el estado runtime del SDK (agente/task actual): grande y no es config
+            return cfg.model_dump(exclude={"state"})
         except Exception:
             pass
     if hasattr(cfg, "dict"):
@@ -34,12 +46,27 @@ def _cfg_to_dict(cfg):
     except Exception:
         return {}
 
-def _require_api_key(task: Task):
+# El worker recibe casi siempre el mismo objeto Configuration: se convierte una vez
+_CFG_MEMO_MAX = 8
+_cfg_memo: list = []  # [(cfg, dict)], más reciente al final
+
+
+def _cfg_dict_cached(cfg) -> dict:
+    if cfg is None or isinstance(cfg, dict):
+        return _cfg_to_dict(cfg)
+    for obj, d in _cfg_memo:
+        if obj is cfg:
+            return d
+    d = _cfg_to_dict(cfg)
+    _cfg_memo.append((cfg, d))
+    if len(_cfg_memo) > _CFG_MEMO_MAX:
+        del _cfg_memo[0]
+    return d
+
+def _require_api_key(cfg: dict):
     if not API_KEY:
         return
 
-    cfg = _cfg_to_dict(task.configuration)
-
     headers = {}
     if isinstance(cfg.get("headers"), dict):
         headers = cfg["headers"]
@@ -79,22 +106,159 @@ def _ensure_json(text: str) -> str:
 
     return json.dumps({"error": "non_json_response", "raw": text[:2000]}, ensure_ascii=False)
 
+# =====================
+# Cache de agentes
+# =====================
+# Backend.aget_args trae la config de la UI y Agent(**args) arma modelo y tools:
+# caro, y casi siempre igual entre tasks. Lo que se cachea es el agente armado
+# SIN task (`aget_args(task=None)`): modelo, instrucciones y tools del agente.
+# Lo que es de cada task (user, session, contexto extra, output schema) va en arun().
+#
+# El SDK mete más cosas de la task en el agente (MCP con OAuth por usuario,
+# memorias por usuario, reasoning tools, deep planning, hooks con el task id);
+# si el agente o la task usan alguna, se arma un agente propio para esa task
+# como antes. Tampoco se comparten agentes con MCP: Agno conecta/desconecta
+# los MCP en cada run sobre el mismo objeto, así que dos runs a la vez se
+# cerrarían las conexiones entre sí (y cachearlos no ahorra la conexión).
+
+
+@dataclass
+class _SharedAgent:
+    agent: Optional[Agent]  # None = este agente no se puede compartir entre tasks
+    output_format: Any = None
+
+
+_agents = TTLCache(max_entries=AGENT_CACHE_MAX, ttl=AGENT_CACHE_TTL_SECONDS)
+_agents_building = SingleFlight()
+
+
+def _agent_key(task: Task) -> tuple:
+    # sin serializar nada: ids + credenciales con las que se resuelve el agente
+    cfg = task.configuration
+    return (
+        getattr(task, "agent_id", None),
+        getattr(task, "agent_version", None),
+        getattr(cfg, "api_key", None),
+        getattr(cfg, "organization_id", None),
+        getattr(cfg, "base_url", None),
+    )
+
+
+def _task_user(task: Task):
+    inp = getattr(task, "input", None)
+    return getattr(inp, "user", None) if inp is not None else None
+
+
+def _task_needs_own_agent(task: Task, shared: _SharedAgent) -> bool:
+    """Lo que el SDK solo sabe aplicar armando el agente con la task."""
+    if shared.agent is None:
+        return True
+    if task.output_format is not None and task.output_format != shared.output_format:
+        return True  # json/markdown cambia el agente, no solo el schema
+    if isinstance(task.expected_output, str) and task.expected_output.strip():
+        return True
+    if isinstance(task.mcp_servers, list) and task.mcp_servers:
+        return True
+    if task.think_mode == ThinkMode.Harder:
+        return True
+    return bool(getattr(getattr(task, "deep_planning", None), "enabled", False))
+
+
+def _shareable(xp_agent) -> bool:
+    settings = xp_agent.agno_settings
+    return not (
+        xp_agent.is_a_team
+        or xp_agent.mcp_servers
+        or xp_agent.deep_planning
+        or (settings is not None and settings.user_memories)
+    )
+
+
+def _run_kwargs(task: Task) -> dict:
+    """Lo de cada task que Agno acepta en arun() sobre un agente compartido."""
+    user = _task_user(task)
+    context = {}
+    if user is not None:
+        context["user_details"] = user.model_dump(mode="json")
+    if task.additional_context:
+        context["task_context"] = task.additional_context
+    kwargs = {"session_id": task.id, "user_id": getattr(user, "id", None)}
+    if context:
+        kwargs.update(dependencies=context, add_dependencies_to_context=True)
+    return {k: v for k, v in kwargs.items() if v}
+
+
+async def _build_task_agent(task: Task) -> Agent:
+    backend = Backend(configuration=task.configuration)
+    return Agent(**await backend.aget_args(task=task))
+
+
+async def _build_shared(task: Task) -> _SharedAgent:
+    xp_agent = await Agents(configuration=task.configuration).aget(
+        agent_id=task.agent_id, version=task.agent_version
+    )
+    if not _shareable(xp_agent):
+        return _SharedAgent(None)
+    backend = Backend(configuration=task.configuration)
+    agent = Agent(**await backend.aget_args(agent=xp_agent, task=None))
+    return _SharedAgent(agent, xp_agent.output_format)
+
+
+async def _get_agent(task: Task) -> tuple[Agent, dict]:
+    """(agente, kwargs extra para arun)."""
+    if not _agents.enabled:
+        return await _build_task_agent(task), {}
+    key = _agent_key(task)
+    shared = _agents.get(key)
+    if shared is None:
+        async def _build() -> _SharedAgent:
+            built = await _build_shared(task)
+            _agents.set(key, built)
+            print("[agent_cache] armado", key[0], "compartido" if built.agent is not None else "por task")
+            return built
+
+        # varias tasks iguales en paralelo con la cache fría: se arma uno solo
+        shared, _ = await _agents_building.do(key, _build)
+
+    if _task_needs_own_agent(task, shared):
+        return await _build_task_agent(task), {}
+    return shared.agent, _run_kwargs(task)
+
+
+# Config de intents: misma que app.py (INTENT_CONFIG_PATH). Se carga al importar
+# (si es inválida, no arranca) y el polling se engancha al loop en la 1ra task.
+_config_watcher = None
+if config_store.INTENT_CONFIG_PATH:
+    _config_watcher = config_store.ConfigWatcher(
+        config_store.INTENT_CONFIG_PATH,
+        config_store.INTENT_CONFIG_POLL_SECONDS,
+        on_change=lambda old, new, err: print("[config]", new.version if new else f"reload rechazado: {err}"),
+    )
+    _config_watcher.load_now()
+
+
 @on_task
 async def my_agent_handler(task: Task):
     # 0) API key gate (si aplica)
-    _require_api_key(task)
+    _require_api_key(_cfg_dict_cached(task.configuration))
+    if _config_watcher is not None:
+        _config_watcher.ensure_started()
 
     # 1) intent pack (determinístico)
+    t0 = time.perf_counter()
     user_text = task.to_message()
-    cls = classify_intent_and_score(user_text)
+    active = config_store.active()
+    cls = classify_intent_and_score(user_text, active.classifier)
+    stages_ms = {"classify": round((time.perf_counter() - t0) * 1000, 2)}
 
-    # ✅ VERIFICACIÓN DURA: log en consola (xpander dev)
-    print("[intent_classifier]", json.dumps(cls, ensure_ascii=False))
+    # ✅ VERIFICACIÓN DURA: log en consola (xpander dev) si no hay event log
+    if not event_log.enabled():
+        print("[intent_classifier]", json.dumps(cls, ensure_ascii=False))
 
-    # 2) Agno agent DESDE UI (xpander backend)
-    backend = Backend(configuration=task.configuration)
-    agno_args = await backend.aget_args(task=task)
-    agno_agent = Agent(**agno_args)
+    # 2) Agno agent DESDE UI (xpander backend), cacheado por agente si no depende de la task
+    t1 = time.perf_counter()
+    agno_agent, run_kwargs = await _get_agent(task)
+    stages_ms["agent"] = round((time.perf_counter() - t1) * 1000, 2)
 
     # 3) Pasarle intent al agente principal SIN romper el contract (solo contexto interno)
     intent_context = (
@@ -107,15 +271,29 @@ async def my_agent_handler(task: Task):
     composed_input = intent_context + "\n\nUSER_MESSAGE:\n" + user_text
 
     # 4) Ejecutar LLM
+    t2 = time.perf_counter()
     result = await agno_agent.arun(
         input=composed_input,
         files=task.get_files(),
-        images=task.get_images()
+        images=task.get_images(),
+        **run_kwargs,
     )
+    stages_ms["llm"] = round((time.perf_counter() - t2) * 1000, 2)
 
     # 5) JSON contract (NO lo rompas)
     task.result = _ensure_json(getattr(result, "content", ""))
 
+    event_log.emit({
+        "event": "task",
+        "msg_hash": event_log.message_hash(user_text),
+        "intent": (cls.get("intent") or {}).get("id"),
+        "score": cls.get("score"),
+        "reasons": cls.get("reasons", []),
+        "config_version": active.version,
+        "contract_bytes": len(task.result.encode("utf-8")),
+        "stages_ms": stages_ms,
+    })
+
     # 6) (Opcional) métricas
     metrics = getattr(result, "metrics", None)
     task.tokens = Tokens(